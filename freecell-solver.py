@@ -1,4 +1,10 @@
 import search, msfreecell, random, math, collections, copy, sys, io, time, functools
+import concurrent.futures, multiprocessing, json, queue, traceback
+from fractions import Fraction
+try:
+    import numpy # only needed for the batch heuristics (batchHeuristic)
+except ImportError:
+    numpy = None
 
 #######################################################################
 # Representing state in freecell:
@@ -14,6 +20,42 @@ SUIT = 1
 
 allCardsInPriority = [r+s for r in ranks for s in suits]
 #print(allCardsInPriority) #debug
+# Compact card codes: a card's code is its index in allCardsInPriority,
+# so code // len(suits) is the rank index and code % len(suits) the suit index
+cardCodes = {card: code for code, card in enumerate(allCardsInPriority)}
+cardRanks = {card: ranks.index(card[RANK]) for card in allCardsInPriority}
+
+# Move legality tables: the cards a card may be placed on in the tableau (one
+# rank higher, other colour), and the card it must follow onto its stack
+tableauParents = {card: frozenset(ranks[ranks.index(card[RANK])+1] + s
+                                  for s in validTableauNeighborSuit[card[SUIT]])
+                        if card[RANK] != ranks[-1] else frozenset()
+                  for card in allCardsInPriority}
+foundationPredecessor = {card: ranks[ranks.index(card[RANK])-1] + card[SUIT]
+                               if card[RANK] != ranks[0] else None
+                         for card in allCardsInPriority}
+
+# Zobrist hashing: every (card, slot) pair gets a fixed random 64-bit key and
+# a state's hash is the XOR of the keys of where each card sits.  A card's slot
+# is the stacks (a card's stack is fixed by its suit), its bay, or its
+# (column, row) in the tableau.  Moving a card just XORs out its old key and
+# XORs in its new one.  The keys are seeded so every process agrees on them.
+# The symmetric hash (see FreecellState.symmetricHash) ignores the order of
+# the columns and bays instead: each column is hashed on its own with the
+# column 0 slots and scrambled by mixHash, and the column hashes are added up.
+STACK_SLOT = 0
+def baySlot(bay): return 1 + bay
+def tableauSlot(col, row): return 1 + numCards + col*numCards + row
+zobristRandom = random.Random(52)
+zobristKeys = {card: [zobristRandom.getrandbits(64) for slot in range(tableauSlot(tableauCols, 0))]
+               for card in allCardsInPriority}
+
+def mixHash(h):
+    '''Scramble a 64-bit hash (the splitmix64 finaliser), so that sums of
+    scrambled XOR hashes don't cancel the way XORs do'''
+    h = (h ^ (h >> 30)) * 0xbf58476d1ce4e5b9 & 0xffffffffffffffff
+    h = (h ^ (h >> 27)) * 0x94d049bb133111eb & 0xffffffffffffffff
+    return h ^ (h >> 31)
 
 # t3:s2 means 'tableau column 3 to stack 2'
 # b1:t4 means 'bay one to tableau column 4'
@@ -36,9 +78,9 @@ allCardsInPriority = [r+s for r in ranks for s in suits]
 
 def timedcall(fn, *args):
     "Call function with args; return the time in seconds and result."
-    t0 = time.clock()
+    t0 = time.perf_counter()
     result = fn(*args)
-    t1 = time.clock()
+    t1 = time.perf_counter()
     return t1-t0, result
 
 def average(numbers):
@@ -59,6 +101,17 @@ def timedcalls(n, fn, *args):
             times.append(t)
     return min(times), average(times), max(times)
 
+def percentile(numbers, p):
+    """Return the p-th percentile of a sequence of numbers (the nearest
+    rank: the least number at least p percent of them are no more than)
+    >>> percentile([3, 1, 2], 50)
+    2
+    >>> percentile(range(1, 101), 95)
+    95
+    """
+    numbers = sorted(numbers)
+    return numbers[max(0, math.ceil(p / 100 * len(numbers)) - 1)]
+
 
 def decorator(d):
     """Make function d a decorator: d wraps a function fn.
@@ -82,9 +135,49 @@ def memo(f):
             return result
         except TypeError:
             # some element of args can't be a dict key
-            print("debug: wasn't able to memoize") #debug
-            return f(args)
+            return f(*args)
+    return _f
+
+CacheInfo = collections.namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+@decorator
+def stateMemo(f):
+    """Decorator for the heuristics, which take a search node: caches
+    f(node) under hash(node.state) (the state's Zobrist hash), so nodes
+    for the same state share an entry and no nodes are kept alive.  Each
+    cache holds at most stateMemo.maxsize entries, dropping the least
+    recently used.  Like functools.lru_cache, the decorated function has
+    cache_info() and cache_clear(); clearStateMemos() clears them all."""
+    cache = collections.OrderedDict()
+    stats = [0, 0] # hits, misses
+    def _f(node):
+        key = hash(node.state)
+        try:
+            result = cache[key]
+        except KeyError:
+            stats[1] += 1
+            cache[key] = result = f(node)
+            if len(cache) > stateMemo.maxsize:
+                cache.popitem(last=False)
+            return result
+        stats[0] += 1
+        cache.move_to_end(key)
+        return result
+    def cache_info():
+        return CacheInfo(stats[0], stats[1], stateMemo.maxsize, len(cache))
+    def cache_clear():
+        cache.clear()
+        stats[:] = [0, 0]
+    _f.cache_info, _f.cache_clear = cache_info, cache_clear
+    stateMemo.caches.append(_f)
     return _f
+stateMemo.maxsize = 100000
+stateMemo.caches = []
+
+def clearStateMemos():
+    '''Empty every stateMemo cache and reset its statistics'''
+    for f in stateMemo.caches:
+        f.cache_clear()
 
 @decorator
 def trace(f):
@@ -102,7 +195,7 @@ def trace(f):
                                       signature, result))
         finally:
             trace.level -= 1
-        return f(*args)
+        return result
     trace.level = 0
     return _f
 
@@ -114,6 +207,173 @@ def disabled(f): return f
 ######  FREECELL STATE  ################################################################
 ########################################################################################
 
+@memo
+def allLocations(bayMax):
+    '''Return the location codes of every bay, stack and tableau column,
+    in the order Freecell.actions tries them as destinations.'''
+    result = ['b'+str(b) for b in range(bayMax)] # Bays
+    result += ['s'+str(s) for s in range(len(suits))] # Stacks
+    result += ['t'+str(t) for t in range(tableauCols)] # Tableaus
+    return result
+
+class Move(collections.namedtuple('Move', 'originArea originIndex destArea destIndex card count',
+                                   defaults=(1,))):
+    '''A move of card from location originArea+originIndex to destArea+destIndex,
+    where the areas are 'b' (bays), 's' (stacks) or 't' (tableau columns).
+    Freecell.actions produces these and takeAction consumes them without any
+    string parsing; str(move) and move.notation give the 't3:b1' form.
+    A supermove (count > 1) moves the run of count cards starting at card
+    from one tableau column to another; steps() gives its single-card moves
+    and its notation adds the count, e.g. 't3:t5x4'.
+    >>> Move('t', 3, 'b', 1, 'KH').notation
+    't3:b1'
+    '''
+    __slots__ = ()
+
+    @property
+    def notation(self):
+        if self.count > 1:
+            return '{}{}:{}{}x{}'.format(self.originArea, self.originIndex, self.destArea,
+                                         self.destIndex, self.count)
+        return '{}{}:{}{}'.format(self.originArea, self.originIndex, self.destArea, self.destIndex)
+
+    __str__ = notation.fget
+
+    @classmethod
+    def parse(cls, action, state):
+        '''Return the Move for action notation like 't3:b1' in state'''
+        origin, destination = action.split(sep=':', maxsplit=1)
+        return cls(origin[0], int(origin[1:]), destination[0], int(destination[1:]),
+                   state.getCard(origin))
+
+    def steps(self, state):
+        '''Return the single-card moves that make up this move in state'''
+        if self.count == 1:
+            return [self]
+        return superMoveSteps(state.copy(), self)
+
+    def size(self, state):
+        '''Return the number of single-card moves this move takes in state,
+        len(self.steps(state)) without carrying them out'''
+        if self.count == 1:
+            return 1
+        freeBays = sum(1 for bay in state.bays if not bay)
+        emptyColumns = sum(1 for i, column in enumerate(state.tableau)
+                           if not column and i != self.destIndex)
+        return superMoveLength(self.count, freeBays, emptyColumns)
+
+def superMoveLength(n, freeBays, emptyColumns):
+    '''Number of single-card moves superMoveSteps takes to move a run of n
+    cards with freeBays free bays and emptyColumns spare empty columns
+    >>> superMoveLength(8, 1, 2)
+    27
+    '''
+    if n <= freeBays + 1:
+        return 2*n - 1
+    k = min((freeBays + 1) * 2**(emptyColumns - 1), n - 1)
+    return 2*superMoveLength(k, freeBays, emptyColumns - 1) + superMoveLength(n - k, freeBays, emptyColumns - 1)
+
+def superMoveSteps(state, move):
+    '''Carry out the supermove on state one card at a time, the standard
+    way: park cards in free bays and, when there are more cards than free
+    bays, first shift part of the run into an empty column (recursively).
+    Return the list of single-card moves made.'''
+    steps = []
+    def step(areaCode, index, destAreaCode, destIndex):
+        area = state.bays if areaCode == 'b' else state.tableau
+        single = Move(areaCode, index, destAreaCode, destIndex, area[index][-1])
+        state.takeAction(single)
+        steps.append(single)
+    def moveRun(n, origin, destination, emptyColumns):
+        freeBays = [i for i, bay in enumerate(state.bays) if not bay]
+        if n <= len(freeBays) + 1:
+            for bay in freeBays[:n-1]:
+                step('t', origin, 'b', bay)
+            step('t', origin, 't', destination)
+            for bay in reversed(freeBays[:n-1]):
+                step('b', bay, 't', destination)
+        else:
+            via, rest = emptyColumns[0], emptyColumns[1:]
+            k = min((len(freeBays) + 1) * 2**len(rest), n - 1)
+            moveRun(k, origin, via, rest)
+            moveRun(n - k, origin, destination, rest)
+            moveRun(k, via, destination, rest)
+    emptyColumns = [i for i, column in enumerate(state.tableau)
+                    if not column and i != move.destIndex]
+    moveRun(move.count, move.originIndex, move.destIndex, emptyColumns)
+    return steps
+
+class CompoundMove(tuple):
+    '''A tuple of Moves made one after the other as a single action, such
+    as a move followed by the moves to the stacks it lets autoplay make.
+    >>> CompoundMove((Move('t', 0, 'b', 1, '5D'), Move('t', 0, 's', 0, 'AH'))).notation
+    't0:b1,t0:s0'
+    '''
+    __slots__ = ()
+
+    @property
+    def notation(self):
+        return ','.join(move.notation for move in self)
+
+    __str__ = notation.fget
+
+    def __repr__(self):
+        return 'CompoundMove({!r})'.format(tuple(self))
+
+    def steps(self, state):
+        '''Return the single-card moves that make up this move in state'''
+        if all(move.count == 1 for move in self):
+            return list(self)
+        state, result = state.copy(), []
+        for move in self:
+            result.extend(move.steps(state))
+            state.takeAction(move)
+        return result
+
+    def size(self, state):
+        '''Return the number of single-card moves this move takes in state'''
+        if all(move.count == 1 for move in self):
+            return len(self)
+        return len(self.steps(state))
+
+def safeToStack(card, stackRanks):
+    '''Return True if card can go to the stacks without any risk: it is an
+    ace or a two, or both cards one rank lower of the other colour are
+    already on the stacks, so no card could ever need to be put on it.
+    stackRanks maps each suit to the number of its cards on the stacks.'''
+    rank = ranks.index(card[RANK])
+    return rank <= 1 or all(stackRanks[suit] >= rank for suit in validTableauNeighborSuit[card[SUIT]])
+
+def autoplay(state):
+    '''Keep moving bay and tableau cards that are safe to play (see
+    safeToStack) to the stacks of state.  Return the Moves made.'''
+    moves = []
+    while True:
+        stacks = state.stacks
+        stackRanks = dict.fromkeys(suits, 0)
+        for stack in stacks:
+            if stack:
+                stackRanks[stack[-1][SUIT]] = ranks.index(stack[-1][RANK]) + 1
+        exposed = [('b', i, bay[-1]) for i, bay in enumerate(state.bays) if bay]
+        exposed += [('t', i, column[-1]) for i, column in enumerate(state.tableau) if column]
+        for areaCode, index, card in exposed:
+            if not safeToStack(card, stackRanks):
+                continue
+            predecessor = foundationPredecessor[card]
+            for i, stack in enumerate(stacks):
+                top = stack[-1] if stack else None
+                # stacks are forced into HCDS order so that games match the GOAL
+                if top == predecessor and (top is not None or i == suits.index(card[SUIT])):
+                    move = Move(areaCode, index, 's', i, card)
+                    state.takeAction(move)
+                    moves.append(move)
+                    break
+            else:
+                continue
+            break
+        else:
+            return moves
+
 class FreecellState(object):
     def __init__(self, tableau=None, dealSeed=None, 
                 stacks=None, bays=None, bayMax=4, shorthand=None):
@@ -146,7 +406,7 @@ class FreecellState(object):
             self.__checkValidState()
         else:
             if tableau:
-                self.tableau = copy.deepcopy(tableau)
+                self.tableau = list(tableau)
             else:
                 # Note: tableau is a list of lists.  The inner lists are the
                 # *columns*, not the rows.  (easier to see the leaf cards.)
@@ -157,36 +417,88 @@ class FreecellState(object):
                         # TODO, pull in msCardNumToString into this object
                         self.tableau[i%tableauCols].append(msfreecell.msCardNumToString(card))
             if stacks:
-                self.stacks = copy.deepcopy(stacks)
+                self.stacks = list(stacks)
             else:
                 self.stacks = [[] for s in range(len(suits))]
             if bays:
-                self.bays = copy.deepcopy(bays)
+                self.bays = list(bays)
             else:
                 self.bays = [[] for b in range(self.bayMax)] 
-        self.everyLocation = ['b'+str(b) for b in range(self.bayMax)] # Bays
-        self.everyLocation += ['s'+str(s) for s in range(len(suits))] # Stacks
-        self.everyLocation += ['t'+str(t) for t in range(tableauCols)] # Tableaus
+        # Each bay, stack and column is an immutable tuple, so copies of this
+        # state can share the ones a move doesn't touch (see copy())
+        self.tableau = [tuple(col) for col in self.tableau]
+        self.stacks = [tuple(stack) for stack in self.stacks]
+        self.bays = [tuple(bay) for bay in self.bays]
+        self.everyLocation = allLocations(self.bayMax)
         self.__initializeCardLocations()
+        self.__computeZobrist()
+        # per-column heuristic scores, shared with copies (see columnHeuristic)
+        self.columnScores = {}
+        self.undoLog = None # moves to take back, while apply() is in use
+        self.symmetricZobrist = self.normal = None # computed when first needed
 
     def __repr__(self):
         '''Shorthand notation for the state -- should be code executable'''
         bays = ','.join(self.getRowX(self.bays, 0))
         stacks = ','.join(self.getRowX(self.stacks, -1))
         tableau = ';'.join( [','.join(self.getRowX(self.tableau, r)) for r in range(maxTableauRows)])
-        return 'FreecellState(shorthand="' + bays + ':' + stacks + ':' + tableau + '")'
+        return type(self).__name__ + '(shorthand="' + bays + ':' + stacks + ':' + tableau + '")'
     
     def __str__(self):
         return self.__repr__()
 
     def __eq__(self, other):
-        if repr(self) == repr(other):
-            return True
-        else:
-            return False
+        # the Zobrist hashes only match for equal states (or a rare
+        # collision), so the full comparison is almost never wasted
+        return self is other or (isinstance(other, FreecellState) and
+                                 self.zobrist == other.zobrist and
+                                 self.tableau == other.tableau and
+                                 self.bays == other.bays and
+                                 self.stacks == other.stacks)
 
     def __hash__(self):
-        return hash(repr(self))
+        return self.zobrist
+
+    def canonical(self):
+        '''Return a key for this state that ignores the order of the tableau
+        columns and of the bays (see CanonicalKey)'''
+        return CanonicalKey(self)
+
+    def normalForm(self):
+        '''The state with its columns and bays sorted into a fixed order'''
+        if self.normal is None:
+            self.normal = tuple(sorted(self.tableau)), tuple(sorted(self.bays)), tuple(self.stacks)
+        return self.normal
+
+    def symmetricHash(self):
+        '''A hash of normalForm(): the sum of the scrambled hashes of the
+        columns, combined with the bay cards and the top stack cards
+        >>> s = Freecell(None, seed=2).initial
+        >>> def withColumns(first, second):
+        ...     t = s.copy(); t.tableau[0], t.tableau[1] = first, second; return t
+        >>> s.symmetricHash() == withColumns(s.tableau[1], s.tableau[0]).symmetricHash()
+        True
+        >>> s.symmetricHash() == withColumns(s.tableau[0][:-1] + s.tableau[1][-1:],
+        ...                                  s.tableau[1][:-1] + s.tableau[0][-1:]).symmetricHash()
+        False
+        '''
+        if self.symmetricZobrist is None:
+            total = 0
+            for column in self.tableau:
+                if column:
+                    h = 0
+                    for row, card in enumerate(column):
+                        h ^= zobristKeys[card][tableauSlot(0, row)]
+                    total += mixHash(h)
+            h = total & 0xffffffffffffffff
+            for bay in self.bays:
+                if bay:
+                    h ^= zobristKeys[bay[-1]][baySlot(0)]
+            for stack in self.stacks:
+                if stack:
+                    h ^= zobristKeys[stack[-1]][STACK_SLOT]
+            self.symmetricZobrist = h
+        return self.symmetricZobrist
 
     def __initializeCardLocations(self):
         for i, bay in enumerate(self.bays):
@@ -200,6 +512,19 @@ class FreecellState(object):
                 self.cardLocations[tableau[j]] = "t"+str(i)
         #print(self.cardLocations) # debug
 
+    def __computeZobrist(self):
+        '''Hash the whole state from scratch; takeAction keeps it up to date'''
+        self.zobrist = 0
+        for i, bay in enumerate(self.bays):
+            for card in bay:
+                self.zobrist ^= zobristKeys[card][baySlot(i)]
+        for stack in self.stacks:
+            for card in stack:
+                self.zobrist ^= zobristKeys[card][STACK_SLOT]
+        for i, tableau in enumerate(self.tableau):
+            for j, card in enumerate(tableau):
+                self.zobrist ^= zobristKeys[card][tableauSlot(i, j)]
+
     def __checkValidState(self):
         '''Returns True if the freecell state is valid, otherwise, raises exception'''
         cardCount = {}
@@ -300,24 +625,126 @@ class FreecellState(object):
         self.printState(file=stringOutput)
         return stringOutput.getvalue()
 
-    @trace
+    def copy(self):
+        '''Return an independent copy of this state (without the deal seed).
+        This is copy-on-write: the bay, stack and column tuples are shared
+        with this state and takeAction replaces (rather than modifies) the
+        ones a move touches, so only the outer lists and cardLocations are
+        copied instead of re-deriving everything from scratch.'''
+        new = FreecellState.__new__(FreecellState)
+        new.bayMax = self.bayMax
+        new.dealSeed = None
+        new.tableau = self.tableau[:]
+        new.stacks = self.stacks[:]
+        new.bays = self.bays[:]
+        new.everyLocation = self.everyLocation
+        new.cardLocations = self.cardLocations.copy()
+        new.zobrist = self.zobrist
+        new.columnScores = self.columnScores
+        new.undoLog = None
+        new.symmetricZobrist = new.normal = None
+        return new
+
     def takeAction(self, action):
         '''Modify this state object with the results of taking the 
-        input 'action'.'''
-        origin, destination = action.split(sep=':', maxsplit=1)
-        origin_areaCode, origin_index = tuple(origin)
-        origin_index = int(origin_index)
-        card = self.getArea(origin)[origin_index].pop()
+        input 'action', a Move, a CompoundMove or a Move's notation
+        (e.g. 't3:b1').'''
+        if isinstance(action, str):
+            action = Move.parse(action, self)
+        elif isinstance(action, CompoundMove):
+            for move in action:
+                self.takeAction(move)
+            return self
+        originAreaCode, originIndex, destAreaCode, destIndex, card, count = action
+        if count > 1:
+            return self.__takeSuperMove(originIndex, destIndex, card, count)
+        originArea = self.__area(originAreaCode)
+        if not originArea[originIndex] or originArea[originIndex][-1] != card:
+            raise RuntimeError
         # TODO do we need the validSpot check here?  Can we just put in an assertion instead?
-        if self.validSpot(destination, card):
-            dest_areaCode, dest_index = tuple(destination)
-            dest_index = int(dest_index)
-            self.getArea(destination)[dest_index].append(card)
-            # update card locations
+        if not self.validSpot((destAreaCode, destIndex), card):
+            raise RuntimeError
+        self.__moveCards(originAreaCode, originIndex, destAreaCode, destIndex, 1)
+        return self # debug: not used in calling function, but helps @trace
+
+    def __takeSuperMove(self, originIndex, destIndex, card, count):
+        '''Move the run of count cards starting at card from tableau column
+        originIndex to destIndex in one go.  This ends in the same state
+        as its single-card steps, since the bays and empty columns used on
+        the way are left as they were.'''
+        column, destColumn = self.tableau[originIndex], self.tableau[destIndex]
+        if len(column) < count or column[-count] != card or \
+           (destColumn and destColumn[-1] not in tableauParents[card]):
+            raise RuntimeError
+        self.__moveCards('t', originIndex, 't', destIndex, count)
+        return self
+
+    def __moveCards(self, originAreaCode, originIndex, destAreaCode, destIndex, count):
+        '''Move the top count cards of one location onto another, keeping
+        the hashes and cardLocations up to date, without any checks'''
+        originArea, destArea = self.__area(originAreaCode), self.__area(destAreaCode)
+        origin, dest = originArea[originIndex], destArea[destIndex]
+        if self.undoLog is not None:
+            self.undoLog.append((originArea, originIndex, destArea, destIndex, origin, dest,
+                                 originAreaCode + str(originIndex), self.zobrist))
+        self.symmetricZobrist = self.normal = None
+        start, destStart = len(origin) - count, len(dest)
+        destination = destAreaCode + str(destIndex)
+        for i, card in enumerate(origin[start:]):
+            keys = zobristKeys[card]
+            self.zobrist ^= (keys[self.__slot(originAreaCode, originIndex, start+i)] ^
+                             keys[self.__slot(destAreaCode, destIndex, destStart+i)])
             self.cardLocations[card] = destination
-            return self # debug: not used in calling function, but helps @trace
+        destArea[destIndex] = dest + origin[start:]
+        originArea[originIndex] = origin[:start]
+
+    def apply(self, action):
+        '''Take action (see takeAction) and return a token for undo().
+        From now until that undo, every move made on this state, including
+        later takeAction calls such as the ones autoplay makes, is logged
+        so that it can be taken back.  This lets a search walk the tree on
+        one state instead of copying it for every child.'''
+        if self.undoLog is None:
+            self.undoLog = []
+        token = (len(self.undoLog), self.columnScores)
+        self.takeAction(action)
+        return token
+
+    def undo(self, token):
+        '''Take back every move made since the apply() that returned token.
+        The log holds the hashes from before each move and the bay, stack
+        and column tuples it replaced, so only the moved cards' locations
+        need fixing; putting back the same tuples also means heuristic
+        scores cached for them (see columnHeuristic) still hold.'''
+        mark, self.columnScores = token
+        log = self.undoLog
+        while len(log) > mark:
+            originArea, originIndex, destArea, destIndex, origin, dest, location, \
+                self.zobrist = log.pop()
+            for card in destArea[destIndex][len(dest):]:
+                self.cardLocations[card] = location
+            originArea[originIndex], destArea[destIndex] = origin, dest
+        self.symmetricZobrist = self.normal = None
+        if not log:
+            self.undoLog = None
+
+    def __area(self, areaCode):
+        if areaCode == 't':
+            return self.tableau
+        elif areaCode == 'b':
+            return self.bays
         else:
-            raise RuntimeError
+            return self.stacks
+
+    @staticmethod
+    def __slot(areaCode, index, row):
+        '''Zobrist slot of the card at row of location areaCode+index'''
+        if areaCode == 't':
+            return tableauSlot(index, row)
+        elif areaCode == 'b':
+            return baySlot(index)
+        else:
+            return STACK_SLOT
 
     def getCard(self, location):
         #print('debug: Location.getCard(): areaCode={}, index={}'.format(self.areaCode, self.index))
@@ -401,6 +828,270 @@ class FreecellState(object):
             
 
 
+class CanonicalKey(object):
+    '''Stands in for a FreecellState in sets and dicts, treating two states
+    that differ only in the order of their tableau columns or bays as equal.
+    Those positions are strategically identical, so searching with these
+    keys (see Freecell's symmetry option) avoids re-exploring up to
+    8!*4! copies of each position.  The state itself is kept so the search
+    still reports concrete moves.'''
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+    def __hash__(self):
+        return self.state.symmetricHash()
+
+    def __eq__(self, other):
+        return (isinstance(other, CanonicalKey) and
+                self.state.symmetricHash() == other.state.symmetricHash() and
+                self.state.normalForm() == other.state.normalForm())
+
+    def __repr__(self):
+        return 'CanonicalKey({!r})'.format(self.state)
+
+
+class CompactFreecellState(object):
+    '''A memory-compact alternative to FreecellState.  The whole position is
+    packed into one bytes object:
+
+        [bays][stacks][tableau column lengths][column 0 cards][column 1 cards]...
+
+    Cards are stored as their code (see cardCodes), an empty bay holds
+    EMPTY_BAY and each stack is just a rank counter (stack i always holds
+    suit i, see validSpot).  This takes a couple of hundred bytes per
+    state instead of several kilobytes, so the explored set can hold many
+    more positions.  It implements the same takeAction/getCard/validSpot
+    interface that the Freecell problem uses; tableau, stacks, bays and
+    cardLocations are decoded on demand so the heuristics work unchanged.'''
+
+    __slots__ = ('packed', 'bayMax', 'dealSeed')
+    EMPTY_BAY = 0xff
+
+    def __init__(self, tableau=None, dealSeed=None,
+                stacks=None, bays=None, bayMax=4, shorthand=None, packed=None):
+        self.bayMax = bayMax
+        self.dealSeed = dealSeed
+        if packed is None:
+            # Let FreecellState do the parsing and validation, then pack it
+            state = FreecellState(tableau=tableau, dealSeed=dealSeed, stacks=stacks,
+                                  bays=bays, bayMax=bayMax, shorthand=shorthand)
+            packed = self.pack(state)
+        self.packed = packed
+
+    @classmethod
+    def pack(cls, state):
+        '''Return the packed bytes for any state offering bays/stacks/tableau'''
+        result = bytearray()
+        for bay in state.bays:
+            result.append(cardCodes[bay[0]] if len(bay) > 0 else cls.EMPTY_BAY)
+        for i, stack in enumerate(state.stacks):
+            if len(stack) > 0 and stack[-1][SUIT] != suits[i]:
+                raise ValueError('Stack {} must hold suit {}, found "{}"'.format(i, suits[i], stack[-1]))
+            result.append(len(stack))
+        result.extend(map(len, state.tableau))
+        for col in state.tableau:
+            result.extend(map(cardCodes.__getitem__, col))
+        return bytes(result)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactFreecellState) and self.packed == other.packed
+
+    def __hash__(self):
+        return hash(self.packed)
+
+    def copy(self):
+        '''Return an independent copy of this state (without the deal seed).
+        The packed bytes are immutable, so they can be shared.'''
+        return CompactFreecellState(bayMax=self.bayMax, packed=self.packed)
+
+    def canonical(self):
+        '''Return a key for this state that ignores the order of the tableau
+        columns and of the bays: the packed bytes with both sorted.'''
+        p = self.packed
+        cells = sorted(p[:self.bayMax])
+        columns = []
+        start = self.__cardsStart()
+        for length in p[self.__lengthsStart():self.__cardsStart()]:
+            columns.append(p[start:start+length])
+            start += length
+        columns.sort()
+        return (bytes(cells) + p[self.__stacksStart():self.__lengthsStart()] +
+                bytes(len(col) for col in columns) + b''.join(columns))
+
+    # Offsets into the packed bytes
+    def __stacksStart(self):
+        return self.bayMax
+
+    def __lengthsStart(self):
+        return self.bayMax + len(suits)
+
+    def __cardsStart(self):
+        return self.bayMax + len(suits) + tableauCols
+
+    def __columnStart(self, col):
+        '''Offset of the first (deepest) card of tableau column col'''
+        lengthsStart = self.__lengthsStart()
+        return self.__cardsStart() + sum(self.packed[lengthsStart:lengthsStart+col])
+
+    @property
+    def bays(self):
+        return [[allCardsInPriority[c]] if c != self.EMPTY_BAY else []
+                for c in self.packed[:self.bayMax]]
+
+    @property
+    def stacks(self):
+        start = self.__stacksStart()
+        return [[ranks[r]+suits[i] for r in range(count)]
+                for i, count in enumerate(self.packed[start:start+len(suits)])]
+
+    @property
+    def tableau(self):
+        p = self.packed
+        result = []
+        start = self.__cardsStart()
+        for length in p[self.__lengthsStart():self.__cardsStart()]:
+            result.append([allCardsInPriority[c] for c in p[start:start+length]])
+            start += length
+        return result
+
+    @property
+    def cardLocations(self):
+        result = {}
+        for i, c in enumerate(self.packed[:self.bayMax]):
+            if c != self.EMPTY_BAY:
+                result[allCardsInPriority[c]] = 'b'+str(i)
+        for i, stack in enumerate(self.stacks):
+            for card in stack:
+                result[card] = 's'+str(i)
+        for i, col in enumerate(self.tableau):
+            for card in col:
+                result[card] = 't'+str(i)
+        return result
+
+    @property
+    def everyLocation(self):
+        return allLocations(self.bayMax)
+
+    def __topCode(self, areaCode, index):
+        '''Return the code of the top card at a location, or None if empty'''
+        p = self.packed
+        if areaCode == 'b':
+            return p[index] if p[index] != self.EMPTY_BAY else None
+        elif areaCode == 's':
+            count = p[self.__stacksStart() + index]
+            return (count-1) * len(suits) + index if count > 0 else None
+        else:
+            length = p[self.__lengthsStart() + index]
+            return p[self.__columnStart(index) + length - 1] if length > 0 else None
+
+    def getCard(self, location):
+        code = self.__topCode(location[0], int(location[1:]))
+        return None if code is None else allCardsInPriority[code]
+
+    def validSpot(self, location, card):
+        '''return True or False depending on whether location is
+        a valid spot for card (same rules as FreecellState.validSpot)'''
+        areaCode, index = location[0], int(location[1:]) if isinstance(location, str) else location[1]
+        code = cardCodes[card]
+        rank, suit = divmod(code, len(suits))
+        top = self.__topCode(areaCode, index)
+        if areaCode == 's':
+            # stacks are forced into HCDS order so that games match the GOAL
+            count = self.packed[self.__stacksStart() + index]
+            return suit == index and rank == count
+        elif top is None:
+            return True # an empty bay or tableau column is valid
+        elif areaCode == 'b':
+            return False
+        else:
+            topRank, topSuit = divmod(top, len(suits))
+            return (suits[suit] in validTableauNeighborSuit[suits[topSuit]]) and (topRank == rank+1)
+
+    def takeAction(self, action):
+        '''Modify this state object with the results of taking the
+        input 'action', a Move, a CompoundMove or a Move's notation
+        (e.g. 't3:b1').'''
+        if isinstance(action, str):
+            action = Move.parse(action, self)
+        elif isinstance(action, CompoundMove):
+            for move in action:
+                self.takeAction(move)
+            return self
+        originAreaCode, originIndex, destAreaCode, destIndex, card, count = action
+        if count > 1:
+            return self.__takeSuperMove(originIndex, destIndex, card, count)
+        top = self.__topCode(originAreaCode, originIndex)
+        if top is None or top != cardCodes[card] or not self.validSpot((destAreaCode, destIndex), card):
+            raise RuntimeError
+        code = cardCodes[card]
+        p = bytearray(self.packed)
+        # take the card off its origin...
+        areaCode, index = originAreaCode, originIndex
+        if areaCode == 'b':
+            p[index] = self.EMPTY_BAY
+        elif areaCode == 's':
+            p[self.__stacksStart() + index] -= 1
+        else:
+            lengthAt = self.__lengthsStart() + index
+            del p[self.__columnStart(index) + p[lengthAt] - 1]
+            p[lengthAt] -= 1
+        # ...and put it on its destination
+        areaCode, index = destAreaCode, destIndex
+        if areaCode == 'b':
+            p[index] = code
+        elif areaCode == 's':
+            p[self.__stacksStart() + index] += 1
+        else:
+            lengthAt = self.__lengthsStart() + index
+            lengthsStart = self.__lengthsStart()
+            columnEnd = self.__cardsStart() + sum(p[lengthsStart:lengthAt+1])
+            p.insert(columnEnd, code)
+            p[lengthAt] += 1
+        self.packed = bytes(p)
+        return self
+
+    def __takeSuperMove(self, originIndex, destIndex, card, count):
+        '''Move a run of count cards between tableau columns in one go
+        (see FreecellState.takeAction)'''
+        p = bytearray(self.packed)
+        lengthsStart = self.__lengthsStart()
+        originEnd = self.__columnStart(originIndex) + p[lengthsStart + originIndex]
+        destLength = p[lengthsStart + destIndex]
+        run = p[originEnd-count:originEnd]
+        if p[lengthsStart + originIndex] < count or run[0] != cardCodes[card] or \
+           (destLength and allCardsInPriority[self.__topCode('t', destIndex)] not in tableauParents[card]):
+            raise RuntimeError
+        del p[originEnd-count:originEnd]
+        p[lengthsStart + originIndex] -= count
+        destEnd = self.__cardsStart() + sum(p[lengthsStart:lengthsStart+destIndex+1])
+        p[destEnd:destEnd] = run
+        p[lengthsStart + destIndex] += count
+        self.packed = bytes(p)
+        return self
+
+    def apply(self, action):
+        '''Take action and return a token for undo() (see
+        FreecellState.apply); here that is just the old packed bytes.'''
+        token = self.packed
+        self.takeAction(action)
+        return token
+
+    def undo(self, token):
+        '''Take back every move made since the apply() that returned token'''
+        self.packed = token
+
+    # The display and query helpers only use bays/stacks/tableau, so share them
+    __repr__ = FreecellState.__repr__
+    getRowX = FreecellState.getRowX
+    printState = FreecellState.printState
+    printableCard = FreecellState.printableCard
+    getStackSuits = FreecellState.getStackSuits
+    getNextXStackCardsNeededPerSuit = FreecellState.getNextXStackCardsNeededPerSuit
+    __str__ = FreecellState.__str__
+
+
 freecellGoal = FreecellState(stacks= [[r+suit for r in ranks] for suit in suits])
 #print(freecellGoal)
 #print(repr(freecellGoal))
@@ -408,21 +1099,146 @@ freecellGoal = FreecellState(stacks= [[r+suit for r in ranks] for suit in suits]
 #######################################################################
 # Freecell problem
 
+def generateActions(state, supermoves=False):
+    '''Yield the legal moves in state as Move objects.
+    Only the exposed bay and tableau cards are tried, using the legality
+    tables instead of validSpot.  Origins come in order of the lowest
+    priority card they hold and destinations in allLocations order, which
+    is the order the old scan over every card and location produced.
+    If supermoves is True, each tableau column's single-card moves are
+    followed by its supermoves: runs of 2 or more cards moved to another
+    column, up to (free bays + 1) * 2**(empty columns) cards (not counting
+    the destination among the empty columns).'''
+    bays, stacks, tableau = state.bays, state.stacks, state.tableau
+    origins = []
+    for i, bay in enumerate(bays):
+        if bay:
+            origins.append((cardCodes[bay[-1]], 'b', i, bay[-1]))
+    for i, column in enumerate(tableau):
+        if column:
+            origins.append((min(map(cardCodes.__getitem__, column)), 't', i, column[-1]))
+    origins.sort()
+    emptyBays = [i for i, bay in enumerate(bays) if not bay]
+    stackTops = [stack[-1] if stack else None for stack in stacks]
+    columnTops = [column[-1] if column else None for column in tableau]
+    for code, areaCode, index, card in origins:
+        if areaCode != 'b': # don't move from bay to bay
+            for bay in emptyBays:
+                yield Move(areaCode, index, 'b', bay, card)
+        predecessor = foundationPredecessor[card]
+        for i, top in enumerate(stackTops):
+            # stacks are forced into HCDS order so that games match the GOAL
+            if top == predecessor and (top is not None or i == suits.index(card[SUIT])):
+                yield Move(areaCode, index, 's', i, card)
+        parents = tableauParents[card]
+        # don't move a column's only card to an empty column
+        loneCard = areaCode == 't' and len(tableau[index]) == 1
+        for i, top in enumerate(columnTops):
+            if areaCode == 't' and i == index:
+                continue
+            if (top in parents) if top is not None else not loneCard:
+                yield Move(areaCode, index, 't', i, card)
+        if supermoves and areaCode == 't':
+            for move in generateSuperMoves(tableau, index, len(emptyBays), columnTops):
+                yield move
+
+def generateSuperMoves(tableau, index, freeBays, columnTops):
+    '''Yield the supermoves of the run at the bottom of tableau[index]'''
+    column = tableau[index]
+    run = 1
+    while run < len(column) and column[-run-1] in tableauParents[column[-run]]:
+        run += 1
+    if run == 1:
+        return
+    emptyColumns = columnTops.count(None)
+    for i, top in enumerate(columnTops):
+        if i == index:
+            continue
+        if top is None:
+            # moving the whole column to an empty column gains nothing
+            most = min(run, (freeBays + 1) * 2**(emptyColumns - 1), len(column) - 1)
+            for n in range(2, most + 1):
+                yield Move('t', index, 't', i, column[-n], n)
+        else:
+            n = ranks.index(top[RANK]) - ranks.index(column[-1][RANK])
+            if 2 <= n <= min(run, (freeBays + 1) * 2**emptyColumns) and top in tableauParents[column[-n]]:
+                yield Move('t', index, 't', i, column[-n], n)
+
+
+def pruneActions(node, actions):
+    '''Yield the actions from node except the redundant ones:
+    - moves that undo an earlier move on the path to node with nothing
+      moved to or from either of its locations since (this includes
+      moving the card just moved straight back), and
+    - all but the first of the moves of the same card(s) from the same
+      place to an empty bay, or to an empty tableau column.'''
+    undo = set()
+    touched = set()
+    locations = node.state.bayMax + tableauCols
+    ancestor = node
+    while ancestor.action is not None and len(touched) < locations:
+        moves = ancestor.action if isinstance(ancestor.action, CompoundMove) else (ancestor.action,)
+        for move in reversed(moves):
+            origin, destination = (move.originArea, move.originIndex), (move.destArea, move.destIndex)
+            if move.destArea == 's': # moves to the stacks are never undone
+                touched.add(origin)
+                continue
+            if origin not in touched and destination not in touched:
+                undo.add(Move(move.destArea, move.destIndex, move.originArea, move.originIndex,
+                              move.card, move.count))
+            touched.add(origin)
+            touched.add(destination)
+        ancestor = ancestor.parent
+    empty = set(('b', i) for i, bay in enumerate(node.state.bays) if not bay)
+    empty.update(('t', i) for i, column in enumerate(node.state.tableau) if not column)
+    emptyTargets = set()
+    for action in actions:
+        if action in undo:
+            continue
+        if (action.destArea, action.destIndex) in empty:
+            target = (action.originArea, action.originIndex, action.destArea, action.count)
+            if target in emptyTargets:
+                continue
+            emptyTargets.add(target)
+        yield action
+
+
 class Freecell(search.Problem):
     """docstring for Freecell"""
-    def __init__(self, initial, goal=None, seed=1, shorthand=None, debug=False):
+    def __init__(self, initial, goal=None, seed=1, shorthand=None, debug=False,
+                 compact=False, symmetry=False, supermoves=False, autoplay=False,
+                 pruning=False):
+        '''If compact is True the search runs over CompactFreecellState
+        objects instead of FreecellState objects.  If symmetry is True,
+        positions that differ only in the order of the tableau columns or
+        bays count as the same state for duplicate detection.  If
+        supermoves is True, actions include multi-card tableau moves (see
+        generateActions); solutions list their single-card steps.  If
+        autoplay is True, every move is followed by the moves to the stacks
+        that are safe to make (see safeToStack), recorded together as one
+        CompoundMove, so the search never branches on them.  If pruning
+        is True, moves that undo earlier ones or duplicate a move to an
+        empty bay or column are not expanded (see pruneActions).'''
         super(Freecell, self).__init__(initial, goal)
+        clearStateMemos() # each new problem starts with empty heuristic caches
+        self.symmetry = symmetry
+        self.supermoves = supermoves
+        self.autoplay = autoplay
+        self.pruning = pruning
+        stateClass = CompactFreecellState if compact else FreecellState
         if not self.initial:
             if shorthand:
-                self.initial = FreecellState(shorthand=shorthand)
+                self.initial = stateClass(shorthand=shorthand)
             else:
-                self.initial = FreecellState(dealSeed=seed)
-        if not isinstance(self.initial, FreecellState):
+                self.initial = stateClass(dealSeed=seed)
+        elif compact and isinstance(self.initial, FreecellState):
+            self.initial = CompactFreecellState(bayMax=self.initial.bayMax, dealSeed=self.initial.dealSeed,
+                                                packed=CompactFreecellState.pack(self.initial))
+        if not isinstance(self.initial, (FreecellState, CompactFreecellState)):
             raise TypeError
         #import pdb; pdb.set_trace() #debug
         if not goal:
-            self.goal = FreecellState(stacks= [[r+suit for r in ranks] for suit in suits])
-        self.lastActions = None
+            self.goal = type(self.initial)(stacks= [[r+suit for r in ranks] for suit in suits])
         self.lastState = self.initial
         if debug: print('Problem initial state:\n{}\n'.format(str(self.initial)))
 
@@ -431,70 +1247,78 @@ class Freecell(search.Problem):
         state. The result would typically be a list, but if there are
         many actions, consider yielding them one at a time in an
         iterator, rather than building them all at once."""
-        oldway = '''
-        result = []
-        for loc in state.everyLocation:
-            if loc[0] == 's': continue # don't allow movement off stacks
-            card = state.getCard(loc)
-            if card:
-                for otherLoc in state.everyLocation:
-                    if loc != otherLoc:
-                        if state.validSpot(otherLoc, card):
-                            result.append(loc+':'+otherLoc)
-        #print('debug: actions: {}'.format(result))
-        self.lastActions = result
-        self.lastState = state
-        return result
-        '''
-        result = []
-        locsAdded = {}
-        for card in allCardsInPriority:
-            loc = state.cardLocations[card]
-            if loc in locsAdded:  # don't duplicate starting locs already considered
-                continue
-            else:
-                locsAdded[loc] = 1
-            if loc[0] == 's': continue # don't allow movement off stacks
-            #if loc[0] == 't': # allCardsInPriority includes row info for tableau (e.g. "t3:1")
-            #    locparts = loc.split(sep=':', maxsplit=1)
-            #    loc = locparts[0]
-            #    row = int(locparts[1])
-            #    #print("card {}, loc {}, row {}, len of column {}".format(card,loc,row,len(state.tableau[int(loc[1])]))) #debug
-            #    if row < len(state.tableau[int(loc[1])]) -1: continue # can't move tableau card unless at bottom of column
-            for otherLoc in state.everyLocation:
-                if loc != otherLoc:
-                    # next 3: don't move from empty spot to empty spot
-                    if (loc[0]=='b') and (otherLoc[0]=='b'): continue
-                    if (loc[0]=='s') and (otherLoc[0]=='s'): continue
-                    if ((loc[0]=='t') and (len(state.tableau[int(loc[1])])==1) 
-                            and (otherLoc[0]=='t') and (len(state.tableau[int(otherLoc[1])])==0)): continue
-                    #if state.validSpot(otherLoc, card):
-                    if state.validSpot(otherLoc, state.getCard(loc)):
-                        result.append(loc+':'+otherLoc)
-        #print('debug: actions: {}'.format(result))
-        self.lastActions = result
         self.lastState = state
-        return result
+        keepColumnScores(state)
+        return generateActions(state, self.supermoves)
 
-    @trace
     def result(self, state, action):
         """Return the state that results from executing the given
         action in the given state. The action must be one of
         self.actions(state)."""
-        newState = FreecellState(tableau=state.tableau, stacks=state.stacks,
-                                bays=state.bays, bayMax=state.bayMax, dealSeed=None)
+        newState = state.copy()
         newState.takeAction(action)
         #print('debug: result(state, {}) -> \n{}'.format(action, str(newState)))
         return newState
 
 
+    def prune(self, node, actions):
+        """Drop redundant actions from node if pruning is on."""
+        if self.pruning:
+            return pruneActions(node, actions)
+        return actions
+
+    def successor(self, state, action):
+        """Return the action and resulting state, with the safe moves to
+        the stacks made and added to the action if autoplay is on."""
+        newState = self.result(state, action)
+        if self.autoplay:
+            forced = autoplay(newState)
+            if forced:
+                action = CompoundMove((action,) + tuple(forced))
+        return action, newState
+
+    def make(self, state, action, c):
+        """Carry out action (and the autoplay moves after it) on state in
+        place with state.apply, for searches like search.idastar_search
+        that walk one path at a time."""
+        cost = self.path_cost(c, state, action, None)
+        undo = state.apply(action)
+        if self.autoplay:
+            forced = autoplay(state)
+            if forced:
+                cost += len(forced)
+                action = CompoundMove((action,) + tuple(forced))
+        return action, state, cost, undo
+
+    def unmake(self, state, undo):
+        """Take back the make that returned undo (see state.undo)"""
+        state.undo(undo)
+        return state
+
+    def path_cost(self, c, state1, action, state2):
+        """Each single-card move costs 1, so a supermove or a move with its
+        autoplayed moves costs the number of single-card moves it stands for."""
+        return c + action.size(state1)
+
+    def h(self, node):
+        """Estimated number of moves to the goal, for astar_search and the
+        other g + h searches (see movesHeuristic)."""
+        return movesHeuristic(node)
+
+    def state_key(self, state):
+        """Key used to detect repeated states; with the symmetry option
+        this is the state's canonical (column and bay order free) key."""
+        if self.symmetry:
+            return state.canonical()
+        return state
+
     def value(self, state):
         """For optimization problems, each state has a value.  Hill-climbing
         and related algorithms try to maximize this value."""
         abstract
 
     def __str__(self):
-        return '\nstate: \n{}\nactions: \n{}'.format(str(self.lastState), str(self.lastActions))
+        return '\nstate: \n{}\nactions: \n{}'.format(str(self.lastState), list(generateActions(self.lastState)))
 
 
     def __repr__(self):
@@ -505,12 +1329,12 @@ class Freecell(search.Problem):
 ######  HEURISTIC ROUTINES #############################################################
 ########################################################################################
 
-@memo
+@stateMemo
 def cardsNotOnStacks(node):
     #import pdb; pdb.set_trace()
     return numCards - sum([len(s) for s in node.state.stacks])
 
-@memo
+@stateMemo
 def nonstackCardsNotInTableauRuns(node):
     '''A "tableau run" is a set of red/black descending cards at
     the bottom of a tableau (i.e. cards "stacked" in a valid way
@@ -520,7 +1344,7 @@ def nonstackCardsNotInTableauRuns(node):
     #import pdb; pdb.set_trace()
     raise NotImplementedError
 
-@memo
+@stateMemo
 def obviousUnstacked(node):
     '''Count of cards in the tableau that could be placed on
     the stack right now.
@@ -541,12 +1365,12 @@ def obviousUnstacked(node):
            r += 1
     return r
 
-@memo
+@stateMemo
 def cardsInBay(node):
     #import pdb; pdb.set_trace()
     return sum([len(b) for b in node.state.bays])
 
-@memo
+@stateMemo
 def bayCardsThatCouldBeTableau(node):
     #import pdb; pdb.set_trace()
     r = 0
@@ -559,98 +1383,102 @@ def bayCardsThatCouldBeTableau(node):
                         break
     return r
 
-@memo
+# The tableau heuristics below add up a score for each column.  The column
+# scores only change when a move replaces the column (or, for the ones that
+# depend on the stacks, when the stacks change), so columnHeuristic keeps
+# them with the state and rescores just the columns a move touched.
+
+def buriedColumnScore(column, selectCards=None):
+    '''Count of the cards in column (only those in selectCards, if given)
+    with a card of the same or higher rank on top of them'''
+    count, highest = 0, -1
+    for card in reversed(column):
+        rank = cardRanks[card]
+        if highest >= rank and (selectCards is None or card in selectCards):
+            count += 1
+        if rank > highest:
+            highest = rank
+    return count
+
+def depthBuriedColumnScore(column, context=None):
+    '''Sum over the cards in column with a higher rank card on top of them
+    of how deep they are buried times (12 - their rank)'''
+    total, highest = 0, -1
+    for i in range(len(column)-1, -1, -1):
+        rank = cardRanks[column[i]]
+        if highest > rank:
+            total += (len(column) - i) * (len(ranks) - 1 - rank)
+        if rank > highest:
+            highest = rank
+    return total
+
+def depthBuriedSelectColumnScore(column, selectCards):
+    '''Sum over the cards in column that are in selectCards and have a card
+    of the same or higher rank on top of them of how deep they are buried'''
+    total, highest = 0, -1
+    for i in range(len(column)-1, -1, -1):
+        card = column[i]
+        rank = cardRanks[card]
+        if highest >= rank and card in selectCards:
+            total += len(column) - i
+        if rank > highest:
+            highest = rank
+    return total
+
+def depthLowestRankColumnScore(column, lowestCards):
+    '''Number of cards on top of the cards of lowestCards in column'''
+    return sum(len(column) - i - 1 for i, card in enumerate(column) if card in lowestCards)
+
+def selectStackCards(state):
+    '''The next 3 cards needed on the stacks (see buriedSelectCards)'''
+    return frozenset(state.getNextXStackCardsNeededPerSuit(x=3))
+
+def lowestRankNonStackCards(state):
+    '''The lowest card of each suit that isn't on the stacks yet'''
+    suitNextStackRank = {'H':'A', 'C':'A', 'D':'A', 'S':'A'}
+    for i, s in enumerate(state.stacks):
+        if len(s) > 0:
+            suitNextStackRank[suits[i]] = ranks[min(len(ranks)-1,ranks.index(s[-1][RANK])+1)] # i.e. stack rank + 1
+    return frozenset(suitNextStackRank[s]+s for s in suits)
+
+@stateMemo
 def buriedTableauCards(node):
     '''Count of cards in the tableau which have a higher rank card
     on top of them'''
-    #import pdb; pdb.set_trace()
-    buried_tableau_cards = 0
-    for tCol in node.state.tableau:
-        for i, buriedcard in enumerate(tCol):
-            buriedcardrank = ranks.index(buriedcard[RANK])
-            for j, highercard in enumerate(tCol[i+1:]):
-                if buriedcardrank <= ranks.index(highercard[RANK]):
-                    buried_tableau_cards += 1
-                    break
-    return buried_tableau_cards
+    return sum(buriedColumnScore(tCol) for tCol in node.state.tableau)
 
-@memo
+@stateMemo
 def buriedSelectCards(node):
     '''Count of a select set of cards in the tableau which have a higher rank card
     on top of them.  In this case the select set are the 3 next cards needed on
     the stack (so if the stack already has up to 3H, the select set for hearts would
     be [4H, 5H, 6H]'''
-    #import pdb; pdb.set_trace()
-    selectCards = node.state.getNextXStackCardsNeededPerSuit(x=3)
-    buried_select_tableau_cards = 0
-    for tCol in node.state.tableau:
-        for i, buriedcard in enumerate(tCol):
-            if buriedcard in selectCards:
-                buriedcardrank = ranks.index(buriedcard[RANK])
-                for j, highercard in enumerate(tCol[i+1:]):
-                    if buriedcardrank <= ranks.index(highercard[RANK]):
-                        buried_select_tableau_cards += 1
-                        break
-    #print('selectCards: {}, val: {}'.format(selectCards, buried_select_tableau_cards)) #debug
-    return buried_select_tableau_cards
+    selectCards = selectStackCards(node.state)
+    return sum(buriedColumnScore(tCol, selectCards) for tCol in node.state.tableau)
 
-@memo
+@stateMemo
 def depthBuriedSelectCards(node):
     '''Weighted Count of a select set of cards in the tableau which have a higher rank card
     on top of them (weighted by how far it is burried).  In this case the select set are 
     the 3 next cards needed on the stack (so if the stack already has up to 3H, the 
     select set for hearts would be [4H, 5H, 6H]'''
-    #import pdb; pdb.set_trace()
-    selectCards = node.state.getNextXStackCardsNeededPerSuit(x=3)
-    buried_select_tableau_cards = 0
-    for tCol in node.state.tableau:
-        for i, buriedcard in enumerate(tCol):
-            if buriedcard in selectCards:
-                buriedcardrank = ranks.index(buriedcard[RANK])
-                for j, highercard in enumerate(tCol[i+1:]):
-                    if buriedcardrank <= ranks.index(highercard[RANK]):
-                        buried_select_tableau_cards += len(tCol) - i
-                        #print('tCol:{}, buriedcard:{}, val:{}'.format(tCol, buriedcard, len(tCol)-i))
-                        break
-    #print('selectCards: {}, val: {}'.format(selectCards, buried_select_tableau_cards)) #debug
-    return buried_select_tableau_cards
+    selectCards = selectStackCards(node.state)
+    return sum(depthBuriedSelectColumnScore(tCol, selectCards) for tCol in node.state.tableau)
 
-@memo
+@stateMemo
 def depthBuriedTableauCards(node):
     '''Weighted count of cards in the tableau which have a higher rank
     card on top of them'''
-    #import pdb; pdb.set_trace()
-    rankWeights = [w for w in range(len(ranks)-1, -1, -1)] # 12, 11, 10, ...
-    depth_buried_tableau_cards = 0
-    for tCol in node.state.tableau:
-        for i, bottomcard in enumerate(tCol):
-            bottomcardrank = ranks.index(bottomcard[RANK])
-            for j, highercard in enumerate(tCol[i+1:]):
-                if bottomcardrank < ranks.index(highercard[RANK]):
-                    # weight by how far it is buried and the rank of the card
-                    #depth_buried_tableau_cards += (len(tCol) - (i+j)) * rankWeights[bottomcardrank]
-                    depth_buried_tableau_cards += (len(tCol) - i) * rankWeights[bottomcardrank]
-                    break
-    return depth_buried_tableau_cards
+    return sum(depthBuriedColumnScore(tCol) for tCol in node.state.tableau)
 
-@memo
+@stateMemo
 def depthLowestRank(node):
     '''The depth in the tableau of the lowest un-stacked rank
     of each suit added together'''
-    #import pdb; pdb.set_trace()
-    r = 0
-    suitNextStackRank = {'H':0, 'C':0, 'D':0, 'S':0}
-    for i, s in enumerate(node.state.stacks):
-        if len(s) > 0:
-            suitNextStackRank[suits[i]] = ranks[min(len(ranks)-1,ranks.index(s[-1][RANK])+1)] # i.e. stack rank + 1
-    lowestRankNonStackCards = [suitNextStackRank[s]+s for s in suits]
-    for t in node.state.tableau:
-        for ic, card in enumerate(t):
-            if card in lowestRankNonStackCards:
-                r += len(t) - ic -1 
-    return r
+    lowestCards = lowestRankNonStackCards(node.state)
+    return sum(depthLowestRankColumnScore(t, lowestCards) for t in node.state.tableau)
 
-@memo
+@stateMemo
 def stackCardsAheadOfNeighborSuit(node):
     '''Stack cards that have run ahead of neighbor suits.
     For example, if both red stacks are at 4 (4H and 4D)
@@ -667,7 +1495,7 @@ def stackCardsAheadOfNeighborSuit(node):
     redMin = min(suitNextStackRank['H'], suitNextStackRank['D'])
     return abs(redMin - blackMin)
 
-@memo
+@stateMemo
 def nonEmptyTableaus(node):
     #import pdb; pdb.set_trace()
     return sum([1 for t in node.state.tableau if len(t)>0])
@@ -689,38 +1517,870 @@ heuristics = {
             'obviousUnstacked': {'max':len(suits), 'function':obviousUnstacked},
 }
 
+defaultWeights = {
+    'cardsNotOnStacks':                 9,
+#    'obviousUnstacked':                 0,
+    'cardsInBay':                       0.2,
+#   'nonstackCardsNotInTableauRuns':    2,
+#    'buriedTableauCards':               1,
+#    'buriedSelectCards':               1,
+    'depthBuriedSelectCards':               2,
+#    'depthBuriedTableauCards':          0.5,
+#    'depthLowestRank':                  1,
+#    'stackCardsAheadOfNeighborSuit':    1,
+#    'bayCardsThatCouldBeTableau':       1,
+    'nonEmptyTableaus':                 0.1,
+}
+''' Good weights:
+9, 0, 1, 0, 0.5, 0, 0, 0, 0, 0'''
+
+# heuristic name -> (column score function, function of the state giving
+# the score function's second argument, or None)
+columnHeuristics = {
+    'buriedTableauCards':       (buriedColumnScore, None),
+    'buriedSelectCards':        (buriedColumnScore, selectStackCards),
+    'depthBuriedSelectCards':   (depthBuriedSelectColumnScore, selectStackCards),
+    'depthBuriedTableauCards':  (depthBuriedColumnScore, None),
+    'depthLowestRank':          (depthLowestRankColumnScore, lowestRankNonStackCards),
+}
+
+def columnHeuristic(state, name, keep=False):
+    '''Return the value of the column heuristic called name for state,
+    the same as heuristics[name]['function'] gives.  A FreecellState's
+    column scores are in columnScores, which copies start out sharing, so
+    for a child state only the columns the move replaced are rescored and
+    the total is updated by the difference.  The scores are stored with a
+    state only when it is scored in full or keep is true (see
+    keepColumnScores), so most states hold no scores of their own.
+    (CompactFreecellStates decode new columns every time, so they are
+    always scored in full.)'''
+    score, contextFunction = columnHeuristics[name]
+    context = contextFunction(state) if contextFunction else None
+    tableau = state.tableau
+    cache = getattr(state, 'columnScores', None)
+    entry = cache.get(name) if cache else None
+    if entry is not None and entry[2] == context:
+        columns, scores, context, total = entry
+        changed = [i for i, column in enumerate(tableau) if column is not columns[i]]
+        if not changed:
+            return total
+        scores = scores[:]
+        for i in changed:
+            newScore = score(tableau[i], context)
+            total += newScore - scores[i]
+            scores[i] = newScore
+    else:
+        scores = [score(column, context) for column in tableau]
+        total = sum(scores)
+        keep = True
+    if keep and cache is not None:
+        cache = dict(cache)
+        cache[name] = (tuple(tableau), scores, context, total)
+        state.columnScores = cache
+    return total
+
+def keepColumnScores(state):
+    '''Store state's column scores for the heuristics its ancestors have
+    them for.  Freecell.actions calls this as each state is expanded, so
+    its children are scored against it.'''
+    cache = getattr(state, 'columnScores', None)
+    if cache:
+        for name in list(cache):
+            columnHeuristic(state, name, keep=True)
+
 def heuristic(node, w=None):
     if not w:
-        w = {
-            'cardsNotOnStacks':                 9,
-#            'obviousUnstacked':                 0,
-            'cardsInBay':                       0.2,
-#           'nonstackCardsNotInTableauRuns':    2,
-#            'buriedTableauCards':               1,
-#            'buriedSelectCards':               1,
-            'depthBuriedSelectCards':               2,
-#            'depthBuriedTableauCards':          0.5,
-#            'depthLowestRank':                  1,
-#            'stackCardsAheadOfNeighborSuit':    1,
-#            'bayCardsThatCouldBeTableau':       1,
-            'nonEmptyTableaus':                 0.1,
-        }
-        ''' Good weights:
-        9, 0, 1, 0, 0.5, 0, 0, 0, 0, 0'''
+        w = defaultWeights
     #import pdb; pdb.set_trace()
     val = {}
     for h in w:
         if w[h] > 0:
-            val[h] = heuristics[h]['function'](node)
+            if h in columnHeuristics:
+                val[h] = columnHeuristic(node.state, h)
+            else:
+                val[h] = heuristics[h]['function'](node)
     #print(val) # debug
     #print(node.state) # debug
     return sum([w[i] * val[i]/heuristics[i]['max'] for i in val.keys()])
 
 
+def movesHeuristic(node, w=None):
+    '''heuristic(node, w) rescaled to estimate the number of moves left,
+    for searches that add it to the path cost (search.astar_search,
+    weighted_astar_search, anytime_astar_search).  The weighted terms are
+    fractions of their maxima, so their sum is at most sum(w.values());
+    that is mapped to numCards, the moves needed to stack every card.
+    It is 0 at the goal but not admissible.'''
+    if not w:
+        w = defaultWeights
+    return heuristic(node, w) * numCards / sum(w[h] for h in w if w[h] > 0)
+
+def heuristicResolution(w=None):
+    '''Return the smallest integer r such that heuristic(node, w) * r is a
+    whole number for every node: the least common multiple of the
+    denominators of the w[h]/max terms.  Use it as the resolution of a
+    search.bucket_frontier so that each bucket holds exactly one f value.
+    >>> heuristicResolution({'cardsNotOnStacks': 9, 'cardsInBay': 0.2})
+    260
+    '''
+    if not w:
+        w = defaultWeights
+    r = 1
+    for h in w:
+        if w[h] > 0:
+            term = Fraction(str(w[h])) / Fraction(str(heuristics[h]['max']))
+            r = r * term.denominator // math.gcd(r, term.denominator)
+    return r
+
+
+########################################################################################
+######  BATCH HEURISTICS (NUMPY) #######################################################
+########################################################################################
+
+# Scoring many positions at once: Positions turns a list of states into
+# arrays giving where each card is, and each heuristic in the heuristics table
+# has a vectorised twin in batchHeuristics working on those arrays.  The values
+# are exactly the ones the per-node functions give, so batchHeuristic(nodes, w)
+# == [heuristic(node, w) for node in nodes].
+
+AREA_STACK, AREA_BAY, AREA_TABLEAU = 0, 1, 2
+
+class Positions(object):
+    '''Where every card is in each of a list of states.  area, index and row
+    are len(states) x numCards arrays giving, for each card code, its area
+    (AREA_STACK, AREA_BAY or AREA_TABLEAU), the number of its stack, bay or
+    column, and its row there (0 at the top of a column or the bottom of a
+    stack).  columnLengths and stackLengths count the cards in each column
+    and stack.  Arrays derived from these that several batch heuristics use
+    are computed on first use and kept.
+
+    The states are read in CompactFreecellState's packed layout, so only
+    packing a FreecellState's columns is done card by card; everything
+    else is numpy work on all the states at once.'''
+
+    def __init__(self, states):
+        n = len(states)
+        t = cardTables()
+        packed = [state.packed if isinstance(state, CompactFreecellState)
+                  else CompactFreecellState.pack(state) for state in states]
+        bayMax = states[0].bayMax if states else 0
+        header = bayMax + len(suits) + tableauCols
+        data = numpy.frombuffer(b''.join(packed), numpy.uint8)
+        sizes = numpy.fromiter(map(len, packed), int, n)
+        starts = numpy.cumsum(sizes) - sizes
+        headers = data[starts[:, None] + numpy.arange(header)].astype(numpy.int16)
+        bays = headers[:, :bayMax]
+        self.stackLengths = headers[:, bayMax:bayMax + len(suits)]
+        self.columnLengths = headers[:, bayMax + len(suits):]
+        # a card not in a bay or a column is on its suit's stack, its rank up
+        self.area = numpy.full((n, numCards), AREA_STACK, numpy.int8)
+        self.index = numpy.tile(t['suit'].astype(numpy.int16), (n, 1))
+        self.row = numpy.tile(t['rank'].astype(numpy.int16), (n, 1))
+        owners, places = numpy.nonzero(bays != CompactFreecellState.EMPTY_BAY)
+        codes = bays[owners, places]
+        self.area[owners, codes] = AREA_BAY
+        self.index[owners, codes] = places
+        self.row[owners, codes] = 0
+        # the column cards follow each header, column after column
+        isCard = numpy.ones(len(data), bool)
+        isCard[(starts[:, None] + numpy.arange(header)).ravel()] = False
+        codes = data[isCard]
+        lengths = self.columnLengths.ravel()
+        columnStarts = numpy.cumsum(lengths) - lengths
+        places = numpy.repeat(numpy.arange(n * tableauCols), lengths)
+        owners, columns = places // tableauCols, places % tableauCols
+        rows = numpy.arange(len(codes)) - columnStarts[places]
+        self.area[owners, codes] = AREA_TABLEAU
+        self.index[owners, codes] = columns
+        self.row[owners, codes] = rows
+        # rank of the card at each row of each column, -1 below the last card
+        self.grid = numpy.full((n, tableauCols, max(lengths.max(initial=0), 1)), -1, numpy.int16)
+        self.grid[owners, columns, rows] = t['rank'][codes]
+        self.inTableau = self.area == AREA_TABLEAU
+        self.inBay = self.area == AREA_BAY
+        self.onStack = self.area == AREA_STACK
+        # length of the column each card is in (0 for cards outside the tableau)
+        self.columnLength = numpy.where(self.inTableau, numpy.take_along_axis(
+            self.columnLengths, numpy.minimum(self.index, tableauCols-1), axis=1), 0)
+        self.columnTop = self.inTableau & (self.row == self.columnLength - 1)
+        self.derived = {}
+
+    def buried(self, strict=False):
+        '''For each card, is it in the tableau with a card of a higher (or,
+        unless strict, the same or higher) rank on top of it?'''
+        if strict not in self.derived:
+            # highest rank below each row of each column (-1 for the last card)
+            above = numpy.maximum.accumulate(self.grid[:, :, ::-1], axis=2)[:, :, ::-1]
+            above = numpy.concatenate((above[:, :, 1:], numpy.full(above.shape[:2] + (1,), -1, above.dtype)),
+                                      axis=2)
+            aboveCard = numpy.take_along_axis(above.reshape(len(above), -1), numpy.where(
+                self.inTableau, self.index * above.shape[2] + self.row, 0), axis=1)
+            rank = cardTables()['rank']
+            higher = aboveCard > rank if strict else aboveCard >= rank
+            self.derived[strict] = self.inTableau & higher
+        return self.derived[strict]
+
+    def selectCards(self):
+        '''Mark the cards of selectStackCards(state) for each state.  Like
+        getNextXStackCardsNeededPerSuit, this takes the next 3 cards of each
+        started stack, stopping after the first with more than 3 to go.'''
+        if 'select' not in self.derived:
+            t = cardTables()
+            lengths = self.stackLengths
+            stops = (lengths > 0) & (lengths < len(ranks) - 3)
+            taken = (lengths > 0) & (numpy.cumsum(stops, axis=1) - stops == 0)
+            nextRank = lengths[:, t['suit']]
+            self.derived['select'] = (taken[:, t['suit']] & (t['rank'] >= nextRank) & (t['rank'] < nextRank + 3))
+        return self.derived['select']
+
+    def lowestRankCards(self):
+        '''Mark the cards of lowestRankNonStackCards(state) for each state'''
+        t = cardTables()
+        return t['rank'] == numpy.minimum(self.stackLengths, len(ranks) - 1)[:, t['suit']]
+
+@memo
+def cardTables():
+    '''Arrays indexed by card code: rank, suit, isAce, and the legality
+    tables as matrices, canSitOn[c, t] (t in tableauParents[c]) and
+    isPredecessor[c, p] (p == foundationPredecessor[c])'''
+    canSitOn = numpy.zeros((numCards, numCards), bool)
+    isPredecessor = numpy.zeros((numCards, numCards), bool)
+    for card in allCardsInPriority:
+        for parent in tableauParents[card]:
+            canSitOn[cardCodes[card], cardCodes[parent]] = True
+        if foundationPredecessor[card]:
+            isPredecessor[cardCodes[card], cardCodes[foundationPredecessor[card]]] = True
+    rank = numpy.array([cardRanks[card] for card in allCardsInPriority])
+    return {'rank': rank, 'isAce': rank == 0, 'canSitOn': canSitOn, 'isPredecessor': isPredecessor,
+            'suit': numpy.array([suits.index(card[SUIT]) for card in allCardsInPriority])}
+
+def batchCardsNotOnStacks(p):
+    return numCards - p.onStack.sum(axis=1)
+
+def batchObviousUnstacked(p):
+    t = cardTables()
+    stackTop = p.onStack & (p.row == numpy.take_along_axis(
+        p.stackLengths, numpy.minimum(p.index, len(suits)-1), axis=1) - 1)
+    fits = (stackTop.astype(int) @ t['isPredecessor'].T.astype(int)) > 0
+    # an ace goes on its suit's stack when that is empty
+    fits |= t['isAce'][None, :] & (p.stackLengths[:, t['suit']] == 0)
+    return (p.columnTop & fits).sum(axis=1)
+
+def batchCardsInBay(p):
+    return p.inBay.sum(axis=1)
+
+def batchBayCardsThatCouldBeTableau(p):
+    fits = (p.columnTop.astype(int) @ cardTables()['canSitOn'].T.astype(int)) > 0
+    return (p.inBay & fits).sum(axis=1)
+
+def batchBuriedTableauCards(p):
+    return p.buried().sum(axis=1)
+
+def batchBuriedSelectCards(p):
+    return (p.buried() & p.selectCards()).sum(axis=1)
+
+def batchDepthBuriedSelectCards(p):
+    return numpy.where(p.buried() & p.selectCards(), p.columnLength - p.row, 0).sum(axis=1)
+
+def batchDepthBuriedTableauCards(p):
+    weights = len(ranks) - 1 - cardTables()['rank']
+    return numpy.where(p.buried(strict=True), (p.columnLength - p.row) * weights, 0).sum(axis=1)
+
+def batchDepthLowestRank(p):
+    lowest = p.inTableau & p.lowestRankCards()
+    return numpy.where(lowest, p.columnLength - p.row - 1, 0).sum(axis=1)
+
+def batchStackCardsAheadOfNeighborSuit(p):
+    rank = cardTables()['rank']
+    # rank of the top card of stack i (0 if it is empty)
+    top = [numpy.where(p.onStack & (p.index == i), rank, 0).max(axis=1) for i in range(len(suits))]
+    blackMin = numpy.minimum(top[suits.index('C')], top[suits.index('S')])
+    redMin = numpy.minimum(top[suits.index('H')], top[suits.index('D')])
+    return abs(redMin - blackMin)
+
+def batchNonEmptyTableaus(p):
+    return (p.columnLengths > 0).sum(axis=1)
+
+batchHeuristics = {
+    'cardsNotOnStacks': batchCardsNotOnStacks,
+    'cardsInBay': batchCardsInBay,
+    'buriedTableauCards': batchBuriedTableauCards,
+    'buriedSelectCards': batchBuriedSelectCards,
+    'depthBuriedSelectCards': batchDepthBuriedSelectCards,
+    'depthBuriedTableauCards': batchDepthBuriedTableauCards,
+    'stackCardsAheadOfNeighborSuit': batchStackCardsAheadOfNeighborSuit,
+    'bayCardsThatCouldBeTableau': batchBayCardsThatCouldBeTableau,
+    'nonEmptyTableaus': batchNonEmptyTableaus,
+    'depthLowestRank': batchDepthLowestRank,
+    'obviousUnstacked': batchObviousUnstacked,
+}
+
+def heuristicMatrix(states, names=None):
+    '''Return a len(states) x len(names) integer array of the values of the
+    named heuristics (default: all of those in batchHeuristics) for each
+    state.  This is what weight tuning over recorded positions needs.'''
+    if numpy is None:
+        raise ImportError('heuristicMatrix needs numpy')
+    if names is None:
+        names = list(batchHeuristics)
+    if not states:
+        return numpy.zeros((0, len(names)), int)
+    p = Positions(states)
+    return numpy.stack([batchHeuristics[h](p) for h in names], axis=1)
+
+def batchHeuristic(nodes, w=None):
+    '''Return [heuristic(node, w) for node in nodes], computed for all the
+    nodes together'''
+    if not w:
+        w = defaultWeights
+    names = [h for h in w if w[h] > 0]
+    values = heuristicMatrix([node.state for node in nodes], names)
+    # add the terms up in the same order and way as heuristic() does
+    total = numpy.zeros(len(nodes))
+    for j, h in enumerate(names):
+        total = total + w[h] * values[:, j] / heuristics[h]['max']
+    return total.tolist()
+
+class BatchHeuristic(object):
+    '''The heuristic with weights w, as an f for beam_search that also
+    has batch(nodes), so the search scores each layer in one batchHeuristic
+    call.  That only pays off for CompactFreecellStates (a width 30 beam
+    on deal 1 takes 1.7s instead of 2.3s); FreecellStates are about as
+    quick to score one at a time against their kept column scores (see
+    columnHeuristic), so those are scored with heuristic.'''
+    def __init__(self, w=None):
+        self.w = w
+
+    def __call__(self, node):
+        return heuristic(node, self.w)
+
+    def batch(self, nodes):
+        if nodes and not isinstance(nodes[0].state, CompactFreecellState):
+            return [heuristic(node, self.w) for node in nodes]
+        return batchHeuristic(nodes, self.w)
+
+
+########################################################################################
+######  BATCH SOLVING  #################################################################
+########################################################################################
+
+DealResult = collections.namedtuple('DealResult', 'deal status moves nodes seconds configuration metrics',
+                                    defaults=(None, None))
+
+# A search configuration is a dict of:
+#   name        what to call it in results
+#   algorithm   'greedy' (best_first_graph_search on heuristic, the default),
+#               'weighted-astar' (weighted_astar_search on movesHeuristic) or
+#               'beam' (beam_search on heuristic)
+#   weights     the heuristic weights (default defaultWeights)
+#   ties        'lifo' (default) or 'fifo': which of the greedy search's
+#               equally good nodes to expand first
+#   weight      for weighted-astar (default 3)
+#   width       for beam (default 100)
+# The portfolio races these on a deal (see solvePortfolio).
+portfolio = [
+    {'name': 'default'},
+    {'name': 'fifo', 'ties': 'fifo'},
+    {'name': 'good', 'weights': {'cardsNotOnStacks': 9, 'cardsInBay': 1, 'buriedTableauCards': 0.5}},
+    {'name': 'good-fifo', 'weights': {'cardsNotOnStacks': 9, 'cardsInBay': 1, 'buriedTableauCards': 0.5},
+     'ties': 'fifo'},
+    {'name': 'depth-fifo', 'weights': {'cardsNotOnStacks': 9, 'cardsInBay': 0.5, 'depthBuriedTableauCards': 2,
+                                       'nonEmptyTableaus': 0.1}, 'ties': 'fifo'},
+    {'name': 'beam', 'algorithm': 'beam', 'width': 10},
+]
+
+def searchConfiguration(problem, configuration, metrics=None):
+    '''Run the search described by configuration (see portfolio) on
+    problem, recording it in metrics (a search.SearchMetrics) if given,
+    and return the goal node, or None'''
+    w = configuration.get('weights') or defaultWeights
+    algorithm = configuration.get('algorithm', 'greedy')
+    if algorithm == 'greedy':
+        frontier = search.heap_frontier
+        if configuration.get('ties', 'lifo') == 'fifo':
+            frontier = search.bucket_frontier(heuristicResolution(w), lifo=False)
+        return search.best_first_graph_search(problem, lambda node: heuristic(node, w),
+                                              frontier=frontier, metrics=metrics)
+    elif algorithm == 'weighted-astar':
+        return search.weighted_astar_search(problem, lambda node: movesHeuristic(node, w),
+                                            configuration.get('weight', 3), metrics=metrics)
+    elif algorithm == 'beam':
+        return search.beam_search(problem, lambda node: heuristic(node, w),
+                                  configuration.get('width', 100), metrics=metrics)
+    raise ValueError('unknown search algorithm {!r}'.format(algorithm))
+
+def solveDeal(deal, timeLimit=None, nodeLimit=None, configuration=None, metrics=False, **options):
+    '''Solve MS deal number deal with the search configuration (see
+    portfolio; by default greedy best-first search on heuristic) and
+    return a DealResult.  Its status is 'solved' (and moves is the
+    solution, in single-card moves), 'unsolved' (the search found no
+    solution), or 'node-limit' or 'time-limit' if it ran out of nodes
+    (expansions) or seconds first; nodes is the number of expansions.
+    If metrics is true, the result's metrics are the search's
+    search.SearchMetrics as a dict.  options are passed on to Freecell,
+    e.g. supermoves=True.'''
+    configuration = configuration or {}
+    start = time.perf_counter()
+    problem = search.LimitedProblem(Freecell(None, seed=deal, **options), nodeLimit, timeLimit)
+    recorder = search.SearchMetrics() if metrics else None
+    moves = None
+    try:
+        node = searchConfiguration(problem, configuration, recorder)
+        status = 'solved' if node else 'unsolved'
+        if node:
+            moves = node.solution()
+    except search.SearchLimitExceeded as limit:
+        status = limit.args[0]
+    return DealResult(deal, status, moves, problem.succs, time.perf_counter() - start,
+                      configuration.get('name'), recorder and recorder.as_dict())
+
+def portfolioWorker(results, index, deal, timeLimit, nodeLimit, configuration, options):
+    '''Solve deal with configuration number index of a solvePortfolio
+    race, and put (index, its DealResult) on results'''
+    try:
+        result = solveDeal(deal, timeLimit, nodeLimit, configuration, **options)
+    except Exception:
+        traceback.print_exc()
+        result = DealResult(deal, 'error', None, None, None, configuration.get('name'))
+    results.put((index, result))
+
+def solvePortfolio(deal, configurations=portfolio, timeLimit=None, nodeLimit=None, **options):
+    '''Race the search configurations on deal, each in its own process,
+    and return the DealResult of the first to solve it; the others are
+    then stopped.  The limits apply to each configuration.  If none
+    solves it, return the result that finished last.  A process that
+    dies without a result (killed, say) counts as an 'error'.'''
+    if not configurations:
+        raise ValueError('solvePortfolio needs at least one search configuration')
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=portfolioWorker, daemon=True,
+                                         args=(results, i, deal, timeLimit, nodeLimit, configuration, options))
+                 for i, configuration in enumerate(configurations)]
+    for process in processes:
+        process.start()
+    try:
+        running = dict(enumerate(processes))
+        while running:
+            # a process that exited before the get has flushed its result, if any
+            exited = [i for i, process in running.items() if process.exitcode is not None]
+            try:
+                i, result = results.get(timeout=0.1)
+            except queue.Empty:
+                for i in exited:
+                    del running[i]
+                    result = DealResult(deal, 'error', None, None, None, configurations[i].get('name'))
+                continue
+            del running[i]
+            if result.status == 'solved':
+                break
+        return result
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+def solveDeals(deals, workers=None, timeLimit=None, nodeLimit=None, configurations=None, **options):
+    '''Solve each of deals with solveDeal in a pool of worker processes
+    (by default one per CPU) and yield the DealResults as they finish.
+    A deal whose worker raised an exception gets the status 'error'.
+    With workers=1 the deals are solved in order in this process.  Given
+    a list of configurations, each deal is instead solved in turn by
+    racing them (see solvePortfolio), and workers is not used.'''
+    if configurations:
+        for deal in deals:
+            yield solvePortfolio(deal, configurations, timeLimit, nodeLimit, **options)
+        return
+    if workers == 1:
+        for deal in deals:
+            yield solveDeal(deal, timeLimit, nodeLimit, **options)
+        return
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(solveDeal, deal, timeLimit, nodeLimit, **options): deal
+                   for deal in deals}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except Exception:
+                traceback.print_exc()
+                yield DealResult(futures[future], 'error', None, None, None)
+
+def parseDeals(spec):
+    '''Return the list of deal numbers in spec, a comma separated list of
+    numbers and ranges
+    >>> parseDeals('1-3,617')
+    [1, 2, 3, 617]
+    '''
+    deals = []
+    for part in spec.split(','):
+        first, _, last = part.partition('-')
+        deals.extend(range(int(first), int(last or first) + 1))
+    return deals
+
+freecellSwitches = (('supermoves', True), ('autoplay', True), ('pruning', True),
+                    ('symmetry', False), ('compact', False))
+
+def addFreecellOptions(parser):
+    '''Add a --name/--no-name switch for each Freecell option to an
+    argparse parser'''
+    import argparse
+    for option, default in freecellSwitches:
+        parser.add_argument('--' + option, action=argparse.BooleanOptionalAction, default=default,
+                            help='Freecell {} option'.format(option))
+
+def freecellOptions(args):
+    '''The Freecell options set by the switches addFreecellOptions added'''
+    return {option: getattr(args, option) for option, default in freecellSwitches}
+
+def batchMain(argv):
+    '''The batch command line: freecell-solver.py batch DEALS [options].
+    Prints a tab separated line per deal as it finishes (deal, status,
+    number of moves, nodes, seconds, with --portfolio the configuration
+    that solved it, and with --moves the solution), then a summary line.
+    With --metrics FILE, the search statistics of each deal are written
+    to FILE as a line of JSON.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog='freecell-solver.py batch',
+                                     description='Solve MS Freecell deals in parallel.')
+    parser.add_argument('deals', type=parseDeals, help='deal numbers, e.g. 1-32000 or 1-100,617')
+    parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--time-limit', type=float, help='seconds allowed per deal')
+    parser.add_argument('--node-limit', type=int, help='node expansions allowed per deal')
+    parser.add_argument('--moves', action='store_true', help='print the solutions')
+    parser.add_argument('--portfolio', action='store_true',
+                        help='race the portfolio of search configurations on each deal')
+    parser.add_argument('--metrics', metavar='FILE', type=argparse.FileType('w'),
+                        help='write search statistics to FILE, a line of JSON per deal')
+    addFreecellOptions(parser)
+    args = parser.parse_args(argv)
+    options = freecellOptions(args)
+    if args.metrics:
+        options['metrics'] = True
+    start, solved = time.perf_counter(), 0
+    for result in solveDeals(args.deals, args.workers, args.time_limit, args.node_limit,
+                             portfolio if args.portfolio else None, **options):
+        fields = [result.deal, result.status, len(result.moves) if result.moves else '-',
+                  result.nodes, '-' if result.seconds is None else '{:.2f}'.format(result.seconds)]
+        if args.portfolio:
+            fields.append(result.configuration)
+        if args.moves and result.moves:
+            fields.append(' '.join(result.moves))
+        print('\t'.join(map(str, fields)), flush=True)
+        if args.metrics:
+            print(json.dumps({'deal': result.deal, 'status': result.status,
+                              'configuration': result.configuration, 'metrics': result.metrics}),
+                  file=args.metrics, flush=True)
+        solved += result.status == 'solved'
+    print('# solved {} of {} deals in {:.1f} seconds'.format(solved, len(args.deals),
+                                                        time.perf_counter() - start))
+
+
+########################################################################################
+######  BENCHMARKS #####################################################################
+########################################################################################
+
+# Fixed sets of MS deals to measure the solver on.  hard holds deals known to
+# be hard (11982 has no solution) and ones the default configuration fails on.
+benchmarkSuites = {
+    'first100': list(range(1, 101)),
+    'first1000': list(range(1, 1001)),
+    'hard': [11982, 5152, 2483, 2659, 617, 1, 9, 12],
+}
+
+def benchmarkSummary(results):
+    '''Return a dict summarising a list of DealResults: the number of
+    deals, solved and solveRate, the median, 95th and 99th percentile
+    seconds per deal, the mean, median and 95th percentile nodes
+    expanded, and the mean and median solution length (of solved deals)'''
+    seconds = [result.seconds for result in results if result.seconds is not None]
+    nodes = [result.nodes for result in results if result.nodes is not None]
+    moves = [len(result.moves) for result in results if result.moves]
+    solved = sum(result.status == 'solved' for result in results)
+    summary = {'deals': len(results), 'solved': solved,
+               'solveRate': solved / len(results) if results else None,
+               'statuses': dict(collections.Counter(result.status for result in results))}
+    for name, numbers in (('Seconds', seconds), ('Nodes', nodes), ('Moves', moves)):
+        summary['mean' + name] = average(numbers) if numbers else None
+        for p in (50, 95, 99):
+            summary[('median' if p == 50 else 'p{}'.format(p)) + name] = \
+                percentile(numbers, p) if numbers else None
+    return summary
+
+# The summary figures compareBenchmark checks, each with whether it is a time
+# (and so gets the looser tolerance).  Higher is worse for all of them.
+benchmarkChecks = (('medianSeconds', True), ('p95Seconds', True), ('p99Seconds', True),
+                   ('meanNodes', False), ('medianNodes', False), ('p95Nodes', False),
+                   ('meanMoves', False), ('medianMoves', False))
+
+def compareBenchmark(run, baseline, tolerance=0.1, timeTolerance=0.5):
+    '''Compare a benchmark run with a baseline (both as saved by
+    benchmarkMain) and return a list of regressions, each a line of text:
+    a deal the baseline solved that the run did not, fewer deals solved,
+    or a figure in benchmarkChecks more than tolerance (timeTolerance for
+    times) worse, as a fraction of the baseline's.  Runs with different
+    deals or settings can't be compared, and give a ValueError.'''
+    for setting in ('deals', 'configuration', 'options', 'timeLimit', 'nodeLimit'):
+        if run[setting] != baseline[setting]:
+            raise ValueError('the baseline has a different {}: {!r}'.format(setting, baseline[setting]))
+    regressions = []
+    solvedBefore = {deal for deal, status, *rest in baseline['results'] if status == 'solved'}
+    solvedNow = {deal for deal, status, *rest in run['results'] if status == 'solved'}
+    for deal in sorted(solvedBefore - solvedNow):
+        regressions.append('deal {} is no longer solved'.format(deal))
+    now, before = run['summary'], baseline['summary']
+    if now['solved'] < before['solved']:
+        regressions.append('solved {} deals, down from {}'.format(now['solved'], before['solved']))
+    for figure, isTime in benchmarkChecks:
+        if now[figure] is None or before[figure] is None:
+            continue
+        limit = before[figure] * (1 + (timeTolerance if isTime else tolerance))
+        if now[figure] > limit:
+            regressions.append('{} is {:.4g}, up from {:.4g}'.format(figure, now[figure], before[figure]))
+    return regressions
+
+def benchmarkMain(argv):
+    '''The benchmark command line: freecell-solver.py benchmark SUITE
+    [options].  Solves the deals of a suite in benchmarkSuites (or a list
+    of deals, as for batch) with one search configuration from the
+    portfolio, or with the whole portfolio racing, and prints the
+    summary.  --save FILE stores the run as JSON; --baseline FILE
+    compares the run with a stored one and exits with status 1 if it has
+    regressed (see compareBenchmark).  Node limits make runs repeatable
+    across machines; time limits and times depend on the machine.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog='freecell-solver.py benchmark',
+                                     description='Benchmark the solver on a fixed set of MS deals.')
+    parser.add_argument('suite', help='one of {}, or deal numbers as for batch'.format(
+        ', '.join(sorted(benchmarkSuites))))
+    names = [configuration['name'] for configuration in portfolio]
+    parser.add_argument('-c', '--configuration', choices=names + ['portfolio'], default='default',
+                        help='search configuration to use, or portfolio to race them all')
+    parser.add_argument('-j', '--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--time-limit', type=float, default=10, help='seconds allowed per deal (default 10)')
+    parser.add_argument('--node-limit', type=int, help='node expansions allowed per deal')
+    parser.add_argument('--save', metavar='FILE', help='save the run as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE', help='compare the run with the one saved in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='fraction by which nodes and moves may get worse (default 0.1)')
+    parser.add_argument('--time-tolerance', type=float, default=0.5,
+                        help='fraction by which times may get worse (default 0.5)')
+    parser.add_argument('--verbose', action='store_true', help='print a line per deal')
+    addFreecellOptions(parser)
+    args = parser.parse_args(argv)
+    options = freecellOptions(args)
+    deals = benchmarkSuites.get(args.suite) or parseDeals(args.suite)
+    if not deals:
+        parser.error('suite {} has no deals'.format(args.suite))
+    if args.configuration == 'portfolio':
+        configurations, solveOptions = portfolio, options
+    else:
+        configurations = None
+        solveOptions = dict(options, configuration=portfolio[names.index(args.configuration)])
+    start = time.perf_counter()
+    results = []
+    for result in solveDeals(deals, args.workers, args.time_limit, args.node_limit,
+                             configurations, **solveOptions):
+        results.append(result)
+        if args.verbose:
+            print('\t'.join(map(str, [result.deal, result.status,
+                                      len(result.moves) if result.moves else '-', result.nodes,
+                                      '-' if result.seconds is None else '{:.2f}'.format(result.seconds)])),
+                  flush=True)
+    results.sort(key=lambda result: result.deal)
+    run = {'suite': args.suite, 'deals': deals, 'configuration': args.configuration,
+           'options': options, 'timeLimit': args.time_limit, 'nodeLimit': args.node_limit,
+           'seconds': time.perf_counter() - start, 'summary': benchmarkSummary(results),
+           'results': [[result.deal, result.status, len(result.moves) if result.moves else None,
+                        result.nodes, result.seconds] for result in results]}
+    summary = run['summary']
+    print('# {} ({} deals), {}: solved {} ({:.1%}) in {:.1f} seconds'.format(
+        args.suite, len(deals), args.configuration, summary['solved'], summary['solveRate'], run['seconds']))
+    for name in ('Seconds', 'Nodes', 'Moves'):
+        print('# {:8} mean {}  median {}  p95 {}  p99 {}'.format(name.lower(), *[
+            '-' if summary[figure + name] is None else '{:.4g}'.format(summary[figure + name])
+            for figure in ('mean', 'median', 'p95', 'p99')]))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compareBenchmark(run, baseline, args.tolerance, args.time_tolerance)
+        except ValueError as error:
+            parser.error(str(error))
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            sys.exit(1)
+        print('# no regressions against {}'.format(args.baseline))
+
+
+########################################################################################
+######  SELF CHECKS  ###################################################################
+########################################################################################
+
+# Each fast path checked against the straightforward way it replaced, on the
+# positions of seeded random walks.  Each check takes a state (or, for the
+# batch heuristics, a list of states) and returns a description of the first
+# difference it finds, or None.  Run them with
+#     freecell-solver.py check [DEALS] [--steps N]
+# after changing the code they cover.
+
+def randomWalkStates(deals, steps, compact=False, seed=0):
+    '''Yield the states of random walks of up to steps moves from each of
+    deals'''
+    rng = random.Random(seed)
+    for deal in deals:
+        problem = Freecell(None, seed=deal, compact=compact)
+        state = problem.initial
+        for i in range(steps):
+            yield state
+            actions = list(problem.actions(state))
+            if not actions:
+                break
+            state = problem.result(state, rng.choice(actions))
+
+def scanActions(state):
+    '''The moves in state in notation, found by trying each exposed card
+    on every location with validSpot (the scan generateActions replaced)'''
+    result, locsAdded = [], set()
+    tableau = state.tableau
+    for card in allCardsInPriority:
+        loc = state.cardLocations[card]
+        if loc in locsAdded or loc[0] == 's':
+            continue
+        locsAdded.add(loc)
+        for otherLoc in state.everyLocation:
+            if loc == otherLoc or (loc[0] == 'b' and otherLoc[0] == 'b'):
+                continue
+            if (loc[0] == 't' and len(tableau[int(loc[1])]) == 1
+                    and otherLoc[0] == 't' and len(tableau[int(otherLoc[1])]) == 0):
+                continue
+            if state.validSpot(otherLoc, state.getCard(loc)):
+                result.append(loc + ':' + otherLoc)
+    return result
+
+def checkMoveGeneration(state):
+    '''Does generateActions give the moves scanActions finds, in the same
+    order?'''
+    moves = [move.notation for move in generateActions(state)]
+    if moves != scanActions(state):
+        return 'generateActions gives {}, scanActions {}'.format(moves, scanActions(state))
+
+def checkColumnHeuristics(state):
+    '''Does columnHeuristic, scoring state against the scores its
+    ancestors kept, give each column heuristic's value for the whole
+    tableau?'''
+    for name, (score, contextFunction) in columnHeuristics.items():
+        context = contextFunction(state) if contextFunction else None
+        if columnHeuristic(state, name) != sum(score(column, context) for column in state.tableau):
+            return 'columnHeuristic {} differs from a full scoring'.format(name)
+
+def stateSnapshot(state):
+    '''Everything a search can observe of state, for comparing it before
+    and after moves are taken back'''
+    return (repr(state), hash(state), hash(state.canonical()), dict(state.cardLocations),
+            getattr(state, 'columnScores', None))
+
+@memo
+def checkProblem(compact):
+    '''The Freecell problem checkApplyUndo makes moves with'''
+    return Freecell(None, seed=1, compact=compact, supermoves=True, autoplay=True)
+
+def checkApplyUndo(state):
+    '''Does Freecell.make (apply plus autoplay) give the state successor
+    gives for each move, and does unmake restore state exactly (with its
+    kept column scores), also with another move made and taken back in
+    between?'''
+    problem = checkProblem(isinstance(state, CompactFreecellState))
+    for name in columnHeuristics:
+        columnHeuristic(state, name)
+    before = stateSnapshot(state)
+    for action in list(generateActions(state, True)):
+        _, expected = problem.successor(state, action)
+        _, state, _, undo = problem.make(state, action, 0)
+        problem.actions(state)
+        after = stateSnapshot(state)
+        if after[:4] != stateSnapshot(expected)[:4]:
+            return 'make {} differs from successor'.format(action)
+        for other in list(generateActions(state, True))[:1]:
+            _, state, _, otherUndo = problem.make(state, other, 0)
+            state = problem.unmake(state, otherUndo)
+            if stateSnapshot(state) != after:
+                return 'unmake {} after {} did not restore the state'.format(other, action)
+        state = problem.unmake(state, undo)
+        if stateSnapshot(state) != before:
+            return 'unmake {} did not restore the state'.format(action)
+
+def checkBatchHeuristics(states):
+    '''Does heuristicMatrix give each batch heuristic's per-node values
+    for states, and batchHeuristic heuristic's, for the default and for
+    all-ones weights?  (needs numpy)'''
+    nodes = [search.Node(state) for state in states]
+    names = list(batchHeuristics)
+    values = heuristicMatrix(states, names)
+    for j, name in enumerate(names):
+        for k, node in enumerate(nodes):
+            if values[k, j] != heuristics[name]['function'](node):
+                return 'batch {} differs on\n{}'.format(name, node.state)
+    for w in (None, dict.fromkeys(names, 1)):
+        if batchHeuristic(nodes, w) != [heuristic(node, w) for node in nodes]:
+            return 'batchHeuristic differs from heuristic for weights {}'.format(w)
+
+stateChecks = [checkMoveGeneration, checkColumnHeuristics, checkApplyUndo]
+
+def selfCheck(deals, steps):
+    '''Run the checks on random walks of up to steps moves from each of
+    deals, in both state representations, and return the differences
+    found'''
+    differences = []
+    for compact in (False, True):
+        states = []
+        for state in randomWalkStates(deals, steps, compact):
+            for check in stateChecks:
+                difference = check(state)
+                if difference:
+                    differences.append('{}: {} on\n{}'.format(check.__name__, difference, state))
+            states.append(state)
+        if numpy is not None:
+            difference = checkBatchHeuristics(states)
+            if difference:
+                differences.append('checkBatchHeuristics: ' + difference)
+    return differences
+
+def checkMain(argv):
+    '''The check command line: freecell-solver.py check [DEALS] [--steps
+    N].  Runs the self checks and prints the differences found; exits with
+    status 1 if there are any.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog='freecell-solver.py check',
+                                     description='Check the fast paths against the code they replaced.')
+    parser.add_argument('deals', type=parseDeals, nargs='?', default='1-3',
+                        help='deals to walk from (default 1-3)')
+    parser.add_argument('--steps', type=int, default=100, help='moves in each random walk (default 100)')
+    args = parser.parse_args(argv)
+    differences = selfCheck(args.deals, args.steps)
+    for difference in differences:
+        print(difference)
+    if numpy is None:
+        print('numpy is not installed, so the batch heuristics were not checked')
+    print('{} differences'.format(len(differences)))
+    if differences:
+        sys.exit(1)
 
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        batchMain(sys.argv[2:])
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmarkMain(sys.argv[2:])
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        checkMain(sys.argv[2:])
+        sys.exit()
     # Very hard seed is 11982
     seed = int(sys.argv[1]) if len(sys.argv) == 2 else random.randrange(1, 32000) # MS deals from 0 to 32k
     
@@ -797,9 +2457,9 @@ if __name__ == '__main__':
             problem = Freecell(None, seed=seed)
             print(problem)
             print('Starting...')
-            t0 = time.clock()
+            t0 = time.perf_counter()
             solution = search.best_first_graph_search(problem, heuristic, debug=True)
-            t1 = time.clock()
+            t1 = time.perf_counter()
             print('Deal {} ({} sec): Solution path is: {}'.format(seed, t1-t0, solution.solution()))
         except KeyboardInterrupt:
             import pdb; pdb.set_trace()
@@ -808,10 +2468,10 @@ if __name__ == '__main__':
     if False:
         try:
             for i in range(20):
-                t0 = time.clock()
+                t0 = time.perf_counter()
                 problem = Freecell(None, seed=i)
                 solution = search.best_first_graph_search(problem, heuristic, debug=True)
-                t1 = time.clock()
+                t1 = time.perf_counter()
             print('Deal {} ({} sec): Solution path is: {}'.format(i, t1-t0, solution.solution()))
         except KeyboardInterrupt:
             print(str(problem))
@@ -5,7 +5,8 @@ then create problem instances and solve them with calls to the various search
 functions."""
 
 import utils #custom module
-import math, random, sys, time, bisect, string
+import math, random, sys, time, bisect, string, collections, heapq
+import multiprocessing, queue, os, json
 import sorted_collection
 
 #______________________________________________________________________________
@@ -35,6 +36,37 @@ class Problem(object):
         self.actions(state)."""
         abstract
 
+    def prune(self, node, actions):
+        """Return the actions from node that are worth expanding.  The
+        default keeps them all; override this to drop actions that can't
+        lead anywhere new, e.g. ones that undo the move that led to node."""
+        return actions
+
+    def successor(self, state, action):
+        """Return (action, state2): the state reached by executing action in
+        state, and the action to record for the step.  The default records
+        action itself and uses self.result.  Override this for problems
+        that follow an action with forced moves, returning a compound
+        action that covers them."""
+        return action, self.result(state, action)
+
+    def make(self, state, action, c):
+        """Carry out action in state, reached at path cost c, for searches
+        that walk the tree one path at a time (see idastar_search).
+        Return (action, state2, c2, undo): the action to record and the
+        state and path cost it leads to, as successor and path_cost give
+        them, and what unmake needs to get state back.  The default leaves
+        state alone and undo is state itself; override this and unmake for
+        problems whose states can be changed in place more cheaply than
+        copied."""
+        action, next = self.successor(state, action)
+        return action, next, self.path_cost(c, state, action, next), state
+
+    def unmake(self, state, undo):
+        """Undo the make that returned undo and led to state; return the
+        state from before it."""
+        return undo
+
     def goal_test(self, state):
         """Return True if the state is a goal. The default method compares the
         state to self.goal, as specified in the constructor. Override this
@@ -53,6 +85,12 @@ class Problem(object):
         """For optimization problems, each state has a value.  Hill-climbing
         and related algorithms try to maximize this value."""
         abstract
+
+    def state_key(self, state):
+        """Return the key the graph searches use to recognise a repeated
+        state.  The default is the state itself; override this to treat
+        equivalent (e.g. symmetric) states as the same state."""
+        return state
 #______________________________________________________________________________
 
 class Node(object):
@@ -78,17 +116,28 @@ class Node(object):
     def expand(self, problem):
         "List the nodes reachable in one step from this node."
         return [self.child_node(problem, action)
-                for action in problem.actions(self.state)]
+                for action in problem.prune(self, problem.actions(self.state))]
 
     def child_node(self, problem, action):
         "Fig. 3.10"
-        next = problem.result(self.state, action)
+        action, next = problem.successor(self.state, action)
         return Node(next, self, action,
                     problem.path_cost(self.path_cost, self.state, action, next))
 
     def solution(self):
-        "Return the sequence of actions to go from the root to this node."
-        return [node.action for node in self.path()[1:]]
+        """Return the sequence of actions to go from the root to this node.
+        An action with a steps(state) method (a macro action such as a
+        Freecell supermove) is replaced by the actions it is made of, and
+        actions with a notation attribute (e.g. Freecell moves) are given
+        in that printable form."""
+        actions = []
+        for node in self.path()[1:]:
+            if hasattr(node.action, 'steps'):
+                steps = node.action.steps(node.parent.state)
+            else:
+                steps = [node.action]
+            actions.extend(getattr(a, 'notation', a) for a in steps)
+        return actions
 
     def path(self):
         "Return a list of nodes forming the path from the root to this node."
@@ -104,7 +153,7 @@ class Node(object):
     # want in other contexts.]
 
     def __eq__(self, other):
-        return isinstance(other, Node) and repr(self.state) == repr(other.state)
+        return isinstance(other, Node) and self.state == other.state
 
     def __hash__(self):
         return hash(self.state)
@@ -154,23 +203,36 @@ def tree_search(problem, frontier):
         frontier.extend(node.expand(problem))
     return None
 
-def graph_search(problem, frontier):
+def graph_search(problem, frontier, metrics=None):
     """Search through the successors of a problem to find a goal.
-    The argument frontier should be an empty queue.
-    If two paths reach a state, only use the first one. [Fig. 3.7]"""
-    frontier.append(Node(problem.initial))
-    explored = set()
-    while frontier:
-        node = frontier.pop()
-        #if len(node.solution()) > 0: # debug
-            #print('        examining node: {}\n{}'.format(node.solution()[-1], str(node.state))) # debug
-        if problem.goal_test(node.state):
-            return node
-        explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored
-                        and child not in frontier)
-    return None
+    The argument frontier should be an empty queue; give it an index_key
+    of lambda node: problem.state_key(node.state) to make the frontier
+    membership test O(1).
+    If two paths reach a state, only use the first one. [Fig. 3.7]
+    Give a SearchMetrics as metrics to have the search recorded in it."""
+    try:
+        frontier.append(Node(problem.initial))
+        explored = set()
+        while frontier:
+            node = frontier.pop()
+            #if len(node.solution()) > 0: # debug
+                #print('        examining node: {}\n{}'.format(node.solution()[-1], str(node.state))) # debug
+            if problem.goal_test(node.state):
+                return node
+            explored.add(problem.state_key(node.state))
+            children, duplicates = node.expand(problem), 0
+            for child in children:
+                if problem.state_key(child.state) not in explored and child not in frontier:
+                    frontier.append(child)
+                else:
+                    duplicates += 1
+            if metrics:
+                metrics.expanded(node.depth, len(children), duplicates,
+                                 len(frontier), len(explored))
+        return None
+    finally:
+        if metrics:
+            metrics.finish()
 
 def breadth_first_tree_search(problem):
     "Search the shallowest nodes in the search tree first."
@@ -180,43 +242,83 @@ def depth_first_tree_search(problem):
     "Search the deepest nodes in the search tree first."
     return tree_search(problem, utils.Stack())
 
-def depth_first_graph_search(problem):
+def depth_first_graph_search(problem, metrics=None):
     "Search the deepest nodes in the search tree first."
-    return graph_search(problem, utils.Stack())
+    return graph_search(problem,
+                        utils.Stack(lambda node: problem.state_key(node.state)),
+                        metrics)
 
-def breadth_first_search(problem):
+def breadth_first_search(problem, metrics=None):
     "[Fig. 3.11]"
-    node = Node(problem.initial)
-    if problem.goal_test(node.state):
-        return node
-    frontier = utils.FIFOQueue()
-    frontier.append(node)
-    explored = set()
-    while frontier:
-        node = frontier.pop()
-        explored.add(node.state)
-        for child in node.expand(problem):
-            if child.state not in explored and child not in frontier:
-                if problem.goal_test(child.state):
-                    return child
-                frontier.append(child)
-    return None
-
-def best_first_graph_search(problem, f, debug=False):
+    try:
+        node = Node(problem.initial)
+        if problem.goal_test(node.state):
+            return node
+        frontier = utils.FIFOQueue(lambda node: problem.state_key(node.state))
+        frontier.append(node)
+        explored = set()
+        while frontier:
+            node = frontier.pop()
+            explored.add(problem.state_key(node.state))
+            children, duplicates = node.expand(problem), 0
+            for child in children:
+                if problem.state_key(child.state) not in explored and child not in frontier:
+                    if problem.goal_test(child.state):
+                        return child
+                    frontier.append(child)
+                else:
+                    duplicates += 1
+            if metrics:
+                metrics.expanded(node.depth, len(children), duplicates,
+                                 len(frontier), len(explored))
+        return None
+    finally:
+        if metrics:
+            metrics.finish()
+
+def heap_frontier(f, key):
+    """Return an empty frontier ordered by f, for best_first_graph_search:
+    a binary heap with O(log n) append/pop and O(1) membership by key."""
+    return utils.HeapPriorityQueue(order=min, f=f, index_key=key)
+
+def sorted_frontier(f, key):
+    """Return an empty SortedCollection frontier ordered by f (append and
+    pop are O(n), so prefer heap_frontier for large searches)."""
+    return sorted_collection.SortedCollection(key=f, order=min, index_key=key)
+
+def bucket_frontier(resolution=1, lifo=True):
+    """Return a frontier factory for best_first_graph_search that makes an
+    array of buckets indexed by round(f * resolution), with O(1) append and
+    pop.  Items in the same bucket come out LIFO, or FIFO if lifo is False.
+    Example: frontier=bucket_frontier(100) for f values in steps of 0.01."""
+    def frontier(f, key):
+        return utils.BucketPriorityQueue(order=min, f=f, index_key=key,
+                                         resolution=resolution, lifo=lifo)
+    return frontier
+
+def best_first_graph_search(problem, f, debug=False, frontier=heap_frontier,
+                            metrics=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
     first search; if f is node.depth then we have breadth-first search.
     There is a subtlety: the line "f = memoize(f, 'f')" means that the f
     values will be cached on the nodes as they are computed. So after doing
-    a best first search you can examine the f values of the path returned."""
+    a best first search you can examine the f values of the path returned.
+    Repeated states are recognised by problem.state_key, both in the
+    explored set and among the nodes waiting in the frontier.
+    The frontier argument is a function frontier(f, key) that returns the
+    empty queue to use (e.g. heap_frontier, sorted_frontier or
+    bucket_frontier(resolution)), where key maps a node to its state key.
+    Give a SearchMetrics as metrics to have the search recorded in it."""
     try:
+        if metrics:
+            f = metrics.timed(f)
         f = utils.memoize(f, 'f')
         node = Node(problem.initial)
         if problem.goal_test(node.state):
             return node
-        #frontier = utils.PriorityQueue(order=min, f=f)
-        frontier = sorted_collection.SortedCollection(key=f, order=min)
+        frontier = frontier(f, lambda node: problem.state_key(node.state))
         frontier.append(node)
         explored = set()
         if debug: debugfirstmoves = [] #debug
@@ -233,35 +335,48 @@ def best_first_graph_search(problem, f, debug=False):
                     #     import pdb; pdb.set_trace() #debug
             if problem.goal_test(node.state):
                 return node
-            explored.add(repr(node.state))
-            for child in node.expand(problem):
-                if repr(child.state) not in explored and child not in frontier:
-                    frontier.append(child)
-                elif child in frontier:
+            explored.add(problem.state_key(node.state))
+            children = node.expand(problem)
+            duplicates = 0
+            for child in children:
+                incumbent = frontier.get(child)
+                if incumbent is None:
+                    if problem.state_key(child.state) not in explored:
+                        frontier.append(child)
+                    else:
+                        duplicates += 1
+                else:
                     #import pdb; pdb.set_trace()
                     # here we have a node already in frontier with the same
                     # state.  We check to see if that 'incumbent' node
                     # has a higher path cost.  If so, we replace the 
                     # incumbent node with this new 'child' node (both
                     # get to the same state thru different paths)
-                    incumbent = frontier[frontier.index(child)]
-                    #incumbent = frontier[child]
-    #                if f(child) < f(incumbent):
                     #print('FOUND AN INCUMBANT IN FRONTIER: state=state:{}, f(inccument)={}, f(child)={}'.format(
                     #    repr(incumbent.state)==repr(child.state), f(incumbent), f(child)))
-                    if (f(child) < f(incumbent)) and (child == incumbent):
+                    if f(child) < f(incumbent):
                         if debug: print('DELETING frontier[incumbent]')
-                        del frontier[incumbent]
+                        frontier.remove(incumbent)
                         frontier.append(child)
+                    else:
+                        duplicates += 1
+            if metrics:
+                metrics.expanded(node.depth, len(children), duplicates,
+                                 len(frontier), len(explored))
         return None
     except KeyboardInterrupt:
         #print('frontier: {}, f-scores: {}'.format(frontier, list(map(f, frontier))))
-        print('child: {} (f={}), len(frontier)={}, len(explored)={}'.format(child, f(child), len(frontier), len(explored)))
+        print('node: {} (f={}), len(frontier)={}, len(explored)={}'.format(
+            node, f(node), len(frontier), len(explored)))
         raise
+    finally:
+        if metrics:
+            metrics.finish()
 
-def uniform_cost_search(problem):
+def uniform_cost_search(problem, frontier=heap_frontier, metrics=None):
     "[Fig. 3.14]"
-    return best_first_graph_search(problem, lambda node: node.path_cost)
+    return best_first_graph_search(problem, lambda node: node.path_cost,
+                                   frontier=frontier, metrics=metrics)
 
 def depth_limited_search(problem, limit=50):
     "[Fig. 3.17]"
@@ -278,14 +393,14 @@ def depth_limited_search(problem, limit=50):
                     cutoff_occurred = True
                 elif result is not None:
                     return result
-            return if_(cutoff_occurred, 'cutoff', None)
+            return utils.if_(cutoff_occurred, 'cutoff', None)
 
     # Body of depth_limited_search:
     return recursive_dls(Node(problem.initial), problem, limit)
 
 def iterative_deepening_search(problem):
     "[Fig. 3.18]"
-    for depth in xrange(sys.maxint):
+    for depth in range(sys.maxsize):
         result = depth_limited_search(problem, depth)
         if result != 'cutoff':
             return result
@@ -296,12 +411,325 @@ def iterative_deepening_search(problem):
 greedy_best_first_graph_search = best_first_graph_search
     # Greedy best-first search is accomplished by specifying f(n) = h(n).
 
-def astar_search(problem, h=None):
+def astar_search(problem, h=None, frontier=heap_frontier, metrics=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
-    h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n))
+    h = utils.memoize(h or problem.h, 'h')
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n),
+                                   frontier=frontier, metrics=metrics)
+
+def weighted_astar_search(problem, h=None, weight=2, frontier=heap_frontier,
+                          metrics=None):
+    """Weighted A*: best-first graph search with f(n) = g(n) + weight*h(n).
+    A weight above 1 finds solutions faster; if h is admissible, their
+    cost is at most weight times the optimal cost."""
+    h = utils.memoize(h or problem.h, 'h')
+    return best_first_graph_search(problem,
+                                   lambda n: n.path_cost + weight * h(n),
+                                   frontier=frontier, metrics=metrics)
+
+def anytime_astar_search(problem, h=None, weights=(5, 3, 2, 1.5, 1),
+                         time_limit=None, callback=None, restart=False,
+                         metrics=None):
+    """Anytime Repairing A* (ARA*): weighted A* searches with decreasing
+    weights, each reusing the previous one's work, or with restart=True
+    starting again from the root.  Return the cheapest goal node found, or
+    None; after time_limit seconds, return the best so far (raising
+    SearchLimitExceeded('time-limit') if there is none).  callback(node,
+    weight) is called with each better solution."""
+    h = h or problem.h
+    if metrics:
+        h = metrics.timed(h)
+    h = utils.memoize(h, 'h')
+    deadline = time_limit and time.time() + time_limit
+    key = lambda node: problem.state_key(node.state)
+    root = Node(problem.initial)
+    if problem.goal_test(root.state):
+        return root
+    best = None # cheapest goal node so far
+    g = {key(root): root.path_cost}
+    incons = {key(root): root} # key -> node waiting for the next weight
+    try:
+        for i, weight in enumerate(weights):
+            last = i == len(weights) - 1
+            if restart and i > 0:
+                g, incons = {key(root): root.path_cost}, {key(root): root}
+            f = lambda n: n.path_cost + weight * h(n)
+            frontier = utils.HeapPriorityQueue(min, f, key)
+            for node in incons.values():
+                if best is None or node.path_cost < best.path_cost:
+                    frontier.append(node)
+            incons, closed, improved = {}, set(), False
+            while frontier and (last or not improved):
+                if deadline and time.time() > deadline:
+                    if best is None:
+                        raise SearchLimitExceeded('time-limit')
+                    return best
+                node = frontier.pop()
+                if best is not None and node.path_cost >= best.path_cost:
+                    continue
+                closed.add(key(node))
+                children = node.expand(problem)
+                if metrics:
+                    metrics.expanded(node.depth, len(children), 0, len(frontier), len(closed))
+                for child in children:
+                    k = key(child)
+                    if k in g and g[k] <= child.path_cost:
+                        if metrics:
+                            metrics.duplicates += 1
+                        continue
+                    g[k] = child.path_cost
+                    if problem.goal_test(child.state):
+                        if best is None or child.path_cost < best.path_cost:
+                            best, improved = child, True
+                            if callback: callback(best, weight)
+                    elif best is not None and child.path_cost >= best.path_cost:
+                        continue
+                    elif k in closed:
+                        incons[k] = child
+                    else:
+                        frontier.append(child)
+            for node in frontier:
+                incons[key(node)] = node
+    except SearchLimitExceeded as limit:
+        limit.node = best
+        raise
+    finally:
+        if metrics:
+            metrics.finish()
+    return best
+
+def idastar_search(problem, h=None, weight=1, step=0, table_size=1000000,
+                   metrics=None):
+    """Iterative deepening A* (IDA*) on f(n) = g(n) + weight*h(n), raising
+    the bound by at least step each iteration, with a transposition table
+    of up to table_size states.  States are walked in place with
+    problem.make and problem.unmake.  Return a goal node, or None."""
+    h = h or problem.h
+    if metrics:
+        h = metrics.timed(h)
+    probe = Node(problem.initial)
+    table = collections.OrderedDict()
+    path, actions = set(), []
+    found = object()
+
+    def search(state, g, bound):
+        """Return found (with actions holding the path), or the least f
+        over bound below state."""
+        probe.state, probe.path_cost = state, g
+        f = g + weight * h(probe)
+        if f > bound:
+            return f
+        if problem.goal_test(state):
+            return found
+        key = hash(problem.state_key(state))
+        seen = table.get(key)
+        if key in path or (seen and (seen[0] < g or seen == (g, bound))):
+            if metrics:
+                metrics.duplicates += 1
+            return utils.infinity
+        table[key] = (g, bound)
+        if len(table) > table_size:
+            table.popitem(last=False)
+        path.add(key)
+        least = utils.infinity
+        children = list(problem.actions(state))
+        if metrics:
+            metrics.expanded(len(actions), len(children), 0, len(path), len(table))
+        for action in children:
+            action, state, cost, undo = problem.make(state, action, g)
+            actions.append(action)
+            try:
+                result = search(state, cost, bound)
+            finally:
+                state = problem.unmake(state, undo)
+            if result is found:
+                break
+            actions.pop()
+            least = min(least, result)
+        else:
+            result = least
+        path.discard(key)
+        return result
+
+    try:
+        bound = weight * h(probe)
+        while bound < utils.infinity:
+            result = search(problem.initial, 0, bound)
+            if result is found:
+                return replay_actions(problem, actions)
+            bound = max(result, bound + step)
+        return None
+    finally:
+        if metrics:
+            metrics.finish()
+
+def beam_search(problem, f, width=100, dedupe=True, restarts=0, growth=4,
+                limit=None, metrics=None):
+    """Breadth-first search that keeps only the width nodes with the
+    lowest f at each depth.  If dedupe is false, give a limit on the
+    number of layers.  A failed beam is retried with the width multiplied
+    by growth, up to restarts times.  Return a goal node, or None.
+    If f has a batch method, batch(nodes) -> [f(node) for node in nodes],
+    each layer is scored with one call to it."""
+    if metrics:
+        f = metrics.timed(f)
+    batch = getattr(f, 'batch', None)
+    try:
+        for attempt in range(restarts + 1):
+            root = Node(problem.initial)
+            if problem.goal_test(root.state):
+                return root
+            beam, seen, depth = [root], {hash(problem.state_key(root.state))}, 0
+            while beam and (limit is None or depth < limit):
+                layer = collections.OrderedDict() # key -> first child with it
+                for node in beam:
+                    children, duplicates = node.expand(problem), 0
+                    for child in children:
+                        if problem.goal_test(child.state):
+                            return child
+                        key = hash(problem.state_key(child.state)) if dedupe else len(layer)
+                        if key not in seen and key not in layer:
+                            layer[key] = child
+                        else:
+                            duplicates += 1
+                    if metrics:
+                        metrics.expanded(node.depth, len(children), duplicates,
+                                         len(layer), len(seen))
+                children = list(layer.values())
+                if not children:
+                    break
+                scores = batch(children) if batch else [f(child) for child in children]
+                keep = heapq.nsmallest(width, range(len(children)), key=scores.__getitem__)
+                beam = [children[i] for i in keep]
+                if dedupe:
+                    keys = list(layer)
+                    seen.update(keys[i] for i in keep)
+                depth += 1
+            width *= growth
+        return None
+    finally:
+        if metrics:
+            metrics.finish()
+
+def hash_distributed_search(problem, f, workers=None):
+    """Best-first search on several processes, in the style of HDA* (hash
+    distributed A*): each of the workers (default: one per CPU) owns the
+    states that hash to it.  Return a goal node, or None; raise
+    RuntimeError if a worker dies without reporting."""
+    if problem.goal_test(problem.initial):
+        return Node(problem.initial)
+    workers = workers or multiprocessing.cpu_count()
+    inboxes = [multiprocessing.Queue() for i in range(workers)]
+    results = multiprocessing.Queue()
+    done = multiprocessing.Event()
+    pending = multiprocessing.Value('q', 1)
+    owner = hash(problem.state_key(problem.initial)) % workers
+    inboxes[owner].put([(problem.initial, 0, ())])
+    processes = [multiprocessing.Process(target=hash_distributed_worker, daemon=True,
+                                         args=(problem, f, i, inboxes, results, done, pending))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        while True:
+            # a worker that exited before this get and sent nothing died
+            exited = [process for process in processes if process.exitcode is not None]
+            try:
+                actions = results.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if exited:
+                    raise RuntimeError('hash_distributed_search worker exited with code {}'.format(
+                        exited[0].exitcode))
+        if isinstance(actions, Exception):
+            raise actions
+    finally:
+        done.set()
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+    if actions is None:
+        return None
+    return replay_actions(problem, actions)
+
+def hash_distributed_worker(problem, f, number, inboxes, results, done, pending):
+    """The work of process number of a hash_distributed_search.  Messages
+    are lists of (state, path cost, actions from the root) triples; the
+    actions make each queued node cost memory in proportion to its depth,
+    but let any worker report a solution without asking the others for its
+    path.  Nodes are made without parents, so problem.prune can't look back
+    up the path.  An exception is sent back in place of a result."""
+    workers, inbox = len(inboxes), inboxes[number]
+    for q in inboxes:
+        q.cancel_join_thread() # don't wait to flush children nobody will read
+    frontier, best_g, count = [], {}, 0
+
+    def add(state, g, actions):
+        "Put a node on the frontier unless its state was reached as cheaply."
+        nonlocal count
+        key = problem.state_key(state)
+        if key in best_g and best_g[key] <= g:
+            return False
+        best_g[key] = g
+        count += 1
+        heapq.heappush(frontier, (f(Node(state, None, None, g)), count, state, g, actions))
+        return True
+
+    def finished(n):
+        "Take n nodes off the pending count; if none are left, stop."
+        with pending.get_lock():
+            pending.value -= n
+            if pending.value == 0:
+                results.put(None)
+                done.set()
+
+    try:
+        while not done.is_set():
+            dropped = 0
+            while True:
+                try:
+                    message = inbox.get_nowait() if frontier else inbox.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                dropped += sum(not add(*triple) for triple in message)
+            if dropped:
+                finished(dropped)
+            if not frontier:
+                continue
+            _, _, state, g, actions = heapq.heappop(frontier)
+            if best_g[problem.state_key(state)] < g:
+                finished(1) # replaced by a cheaper path to the state
+                continue
+            if problem.goal_test(state):
+                results.put(actions)
+                done.set()
+                break
+            children = Node(state, None, None, g).expand(problem)
+            with pending.get_lock():
+                pending.value += len(children)
+            outgoing = [[] for i in range(workers)]
+            for child in children:
+                outgoing[hash(problem.state_key(child.state)) % workers].append(
+                    (child.state, child.path_cost, actions + (child.action,)))
+            for i, message in enumerate(outgoing):
+                if message and i != number:
+                    inboxes[i].put(message)
+            finished(1 + sum(not add(*triple) for triple in outgoing[number]))
+    except Exception as exception:
+        results.put(exception)
+        done.set()
+
+def replay_actions(problem, actions):
+    """Return the node reached by taking actions from problem.initial."""
+    node = Node(problem.initial)
+    for action in actions:
+        next = problem.result(node.state, action)
+        node = Node(next, node, action,
+                    problem.path_cost(node.path_cost, node.state, action, next))
+    return node
 
 #______________________________________________________________________________
 # Other search algorithms
@@ -500,9 +928,9 @@ def RandomGraph(nodes=range(10), min_links=2, width=400, height=300,
                 here = g.locations[node]
                 def distance_to_node(n):
                     if n is node or g.get(node,n): return infinity
-                    return distance(g.locations[n], here)
+                    return utils.distance(g.locations[n], here)
                 neighbor = argmin(nodes, distance_to_node)
-                d = distance(g.locations[neighbor], here) * curvature()
+                d = utils.distance(g.locations[neighbor], here) * curvature()
                 g.connect(node, neighbor, int(d))
     return g
 
@@ -556,7 +984,7 @@ class GraphProblem(Problem):
         "h function is straight-line distance from a node's state to goal."
         locs = getattr(self.graph, 'locations', None)
         if locs:
-            return int(distance(locs[node.state], locs[self.goal]))
+            return int(utils.distance(locs[node.state], locs[self.goal]))
         else:
             return infinity
 
@@ -814,6 +1242,20 @@ class InstrumentedProblem(Problem):
         self.states += 1
         return self.problem.result(state, action)
 
+    def prune(self, node, actions):
+        return self.problem.prune(node, actions)
+
+    def successor(self, state, action):
+        self.states += 1
+        return self.problem.successor(state, action)
+
+    def make(self, state, action, c):
+        self.states += 1
+        return self.problem.make(state, action, c)
+
+    def unmake(self, state, undo):
+        return self.problem.unmake(state, undo)
+
     def goal_test(self, state):
         self.goal_tests += 1
         result = self.problem.goal_test(state)
@@ -827,6 +1269,9 @@ class InstrumentedProblem(Problem):
     def value(self, state):
         return self.problem.value(state)
 
+    def state_key(self, state):
+        return self.problem.state_key(state)
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
@@ -834,6 +1279,216 @@ class InstrumentedProblem(Problem):
         return '<%4d/%4d/%4d/%s>' % (self.succs, self.goal_tests,
                                      self.states, str(self.found)[:4])
 
+class SearchLimitExceeded(Exception):
+    """Raised by a LimitedProblem when a limit runs out; args[0] says
+    which: 'node-limit', 'time-limit', 'memory-limit' or 'cancelled'.
+    A search may set the node attribute to the best node it has (as
+    anytime_astar_search does with its best solution)."""
+    node = None
+
+class CancellationToken(object):
+    """Set with cancel() (from another thread, or a signal handler) to stop
+    a search using a LimitedProblem at its next expansion.  A
+    threading.Event, or a multiprocessing.Event for searches with worker
+    processes, can be used in its place."""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def is_set(self):
+        return self.cancelled
+
+def peak_memory():
+    """Return the most memory this process has used, in bytes: the peak of
+    its resident set size."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def resident_memory():
+    """Return the memory this process is using, in bytes: its resident set
+    size, or where /proc is not available, the peak of it."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_memory()
+
+class LimitedProblem(InstrumentedProblem):
+    """An InstrumentedProblem that stops any search using it, by raising
+    SearchLimitExceeded from actions(), once node_limit nodes have been
+    expanded, time_limit seconds have passed since it was made, the
+    process uses more than memory_limit bytes (checked every
+    memory_interval expansions), or cancel.is_set() is true.  The node
+    most recently expanded with Node.expand is kept as last, and if a
+    score function is given, the expanded node with the lowest
+    score(node) as best.  Searches with worker processes apply the
+    limits to each worker separately."""
+
+    def __init__(self, problem, node_limit=None, time_limit=None,
+                 memory_limit=None, cancel=None, score=None, memory_interval=100):
+        InstrumentedProblem.__init__(self, problem)
+        self.node_limit, self.memory_limit = node_limit, memory_limit
+        self.cancel, self.score, self.memory_interval = cancel, score, memory_interval
+        self.start = time.time()
+        self.deadline = time_limit and self.start + time_limit
+        self.last = self.best = None
+        self.best_score = utils.infinity
+
+    def actions(self, state):
+        if self.node_limit is not None and self.succs >= self.node_limit:
+            raise SearchLimitExceeded('node-limit')
+        if self.deadline and time.time() > self.deadline:
+            raise SearchLimitExceeded('time-limit')
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchLimitExceeded('cancelled')
+        if (self.memory_limit is not None and self.succs % self.memory_interval == 0
+                and resident_memory() > self.memory_limit):
+            raise SearchLimitExceeded('memory-limit')
+        return InstrumentedProblem.actions(self, state)
+
+    def prune(self, node, actions):
+        self.last = node
+        if self.score is not None:
+            v = self.score(node)
+            if v < self.best_score:
+                self.best, self.best_score = node, v
+        return InstrumentedProblem.prune(self, node, actions)
+
+    def stats(self):
+        "Return a dict of the counts so far, the seconds taken and the memory in use."
+        return {'expansions': self.succs, 'goal_tests': self.goal_tests,
+                'states': self.states, 'seconds': time.time() - self.start,
+                'memory': resident_memory()}
+
+SearchResult = collections.namedtuple('SearchResult', 'status node stats')
+SearchResult.__doc__ = """What limited_search returns.  status is 'solved'
+(node is the goal node), 'exhausted' (there is no solution), 'cutoff'
+(from depth_limited_search), or the reason the search was stopped, as
+in SearchLimitExceeded, in which case node is the best node so far, or
+None.  stats is LimitedProblem.stats()."""
+
+def limited_search(searcher, problem, *args, node_limit=None, time_limit=None,
+                   memory_limit=None, cancel=None, score=None, **kwargs):
+    """Run searcher(problem, *args, **kwargs), any of the searches here,
+    within a budget of expanded nodes, seconds, and bytes of memory, and
+    until cancel (a CancellationToken) is set, and return a SearchResult
+    rather than a node or None.  When the search is stopped, the node in
+    the result is the one the search put in the exception, else the
+    expanded node with the lowest score(node) if score is given, else the
+    node expanded last (for best_first_graph_search, the one with the
+    lowest f).  Searches that don't expand Nodes (idastar_search) stop
+    with no node."""
+    limited = LimitedProblem(problem, node_limit, time_limit, memory_limit,
+                             cancel, score)
+    try:
+        result = searcher(limited, *args, **kwargs)
+    except SearchLimitExceeded as limit:
+        node = limit.node or limited.best or limited.last
+        return SearchResult(limit.args[0], node, limited.stats())
+    if result is None:
+        return SearchResult('exhausted', None, limited.stats())
+    if result == 'cutoff':
+        return SearchResult('cutoff', None, limited.stats())
+    return SearchResult('solved', result, limited.stats())
+
+class SearchMetrics(object):
+    """Statistics of a search, given as the metrics argument of
+    best_first_graph_search and the searches built on it, graph_search,
+    depth_first_graph_search, breadth_first_search, anytime_astar_search,
+    idastar_search or beam_search: counts per
+    expansion, time spent in f or h, and the totals and memory sampled
+    every interval seconds (each sample is passed to report, if given).
+    as_dict() and to_json() export it all."""
+
+    def __init__(self, interval=1.0, report=None):
+        self.interval, self.report = interval, report
+        self.expansions = self.generated = self.duplicates = 0
+        self.frontier = self.explored = 0
+        self.peak_frontier = self.peak_explored = self.peak_memory = 0
+        self.heuristic_seconds = 0.0
+        self.depths = collections.Counter() # depth -> expansions
+        self.samples = []
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.next_sample = self.start + interval
+
+    def timed(self, f):
+        """Return f, with the time spent in it (and in its batch method, if
+        it has one) added to heuristic_seconds."""
+        clock = time.perf_counter
+        def timed_f(node):
+            start = clock()
+            try:
+                return f(node)
+            finally:
+                self.heuristic_seconds += clock() - start
+        batch = getattr(f, 'batch', None)
+        if batch:
+            def timed_batch(nodes):
+                start = clock()
+                try:
+                    return batch(nodes)
+                finally:
+                    self.heuristic_seconds += clock() - start
+            timed_f.batch = timed_batch
+        return timed_f
+
+    def expanded(self, depth, generated, duplicates, frontier, explored):
+        "Record the expansion of a node at depth."
+        self.expansions += 1
+        self.generated += generated
+        self.duplicates += duplicates
+        self.depths[depth] += 1
+        self.frontier, self.explored = frontier, explored
+        if frontier > self.peak_frontier:
+            self.peak_frontier = frontier
+        if explored > self.peak_explored:
+            self.peak_explored = explored
+        now = time.perf_counter()
+        if now >= self.next_sample:
+            self.sample(now)
+
+    def sample(self, now=None):
+        "Record the totals so far in samples."
+        now = now or time.perf_counter()
+        self.seconds = now - self.start
+        memory = resident_memory()
+        self.peak_memory = peak_memory()
+        sample = {'seconds': self.seconds, 'expansions': self.expansions,
+                  'generated': self.generated, 'duplicates': self.duplicates,
+                  'frontier': self.frontier, 'explored': self.explored,
+                  'heuristic_seconds': self.heuristic_seconds, 'memory': memory}
+        self.samples.append(sample)
+        self.next_sample = now + self.interval
+        if self.report:
+            self.report(sample)
+
+    def finish(self):
+        "Take the last sample; the searches call this when they stop."
+        self.sample()
+
+    def as_dict(self):
+        "Return the statistics as a dict of numbers, lists and dicts."
+        seconds = self.seconds or 1e-9
+        return {'seconds': self.seconds, 'expansions': self.expansions,
+                'expansions_per_second': self.expansions / seconds,
+                'generated': self.generated, 'duplicates': self.duplicates,
+                'frontier': self.frontier, 'explored': self.explored,
+                'peak_frontier': self.peak_frontier, 'peak_explored': self.peak_explored,
+                'heuristic_seconds': self.heuristic_seconds,
+                'heuristic_share': self.heuristic_seconds / seconds,
+                'peak_memory': self.peak_memory,
+                'depths': {str(depth): n for depth, n in sorted(self.depths.items())},
+                'samples': self.samples}
+
+    def to_json(self, **kwargs):
+        "Return as_dict() as JSON; kwargs are passed to json.dumps."
+        return json.dumps(self.as_dict(), **kwargs)
+
 def compare_searchers(problems, header,
                       searchers=[breadth_first_tree_search,
                                  breadth_first_search, depth_first_graph_search,
@@ -1,6 +1,7 @@
 from bisect import bisect_left, bisect_right
+from utils import KeyIndex
 
-class SortedCollection(object):
+class SortedCollection(KeyIndex):
     '''Sequence sorted by a key function.
 
     SortedCollection() is much easier to work with than using bisect() directly.
@@ -27,6 +28,11 @@ class SortedCollection(object):
     The key function is stored in the 'key' attibute for easy introspection or
     so that you can assign a new key function (triggering an automatic re-sort).
 
+    An optional index_key function groups items by index_key(item) in a dict
+    (see utils.KeyIndex), making get() and contains checking O(1) for items
+    that are equal exactly when their index keys are (e.g. search nodes
+    keyed by their state).
+
     In short, the class was designed to handle all of the common use cases for
     bisect but with a simpler API and support for key functions.
 
@@ -69,7 +75,7 @@ class SortedCollection(object):
 
     '''
 
-    def __init__(self, iterable=(), key=None, order=min):
+    def __init__(self, iterable=(), key=None, order=min, index_key=None):
         self._given_key = key
         key = (lambda x: x) if key is None else key
         decorated = sorted((key(item), item) for item in iterable)
@@ -77,13 +83,18 @@ class SortedCollection(object):
         self._items = [item for k, item in decorated]
         self._key = key
         self.order = order
+        self.index_key = index_key
+        self._index = {}
+        for item in self._items:
+            self._index_add(item)
 
     def _getkey(self):
         return self._key
 
     def _setkey(self, key):
         if key is not self._key:
-            self.__init__(self._items, key=key)
+            self.__init__(self._items, key=key, order=self.order,
+                          index_key=self.index_key)
 
     def _delkey(self):
         self._setkey(None)
@@ -91,10 +102,10 @@ class SortedCollection(object):
     key = property(_getkey, _setkey, _delkey, 'key function')
 
     def clear(self):
-        self.__init__([], self._key)
+        self.__init__([], self._key, self.order, self.index_key)
 
     def copy(self):
-        return self.__class__(self, self._key)
+        return self.__class__(self, self._key, self.order, self.index_key)
 
     def __len__(self):
         return len(self._items)
@@ -116,9 +127,12 @@ class SortedCollection(object):
         )
 
     def __reduce__(self):
-        return self.__class__, (self._items, self._given_key)
+        return self.__class__, (self._items, self._given_key, self.order,
+                                self.index_key)
 
     def __contains__(self, item):
+        if self.index_key is not None:
+            return KeyIndex.__contains__(self, item)
         k = self._key(item)
         i = bisect_left(self._keys, k)
         j = bisect_right(self._keys, k)
@@ -144,6 +158,7 @@ class SortedCollection(object):
         i = bisect_left(self._keys, k)
         self._keys.insert(i, k)
         self._items.insert(i, item)
+        self._index_add(item)
 
     def append(self, item):
         'Equivalent to insert().  DAY'
@@ -151,9 +166,13 @@ class SortedCollection(object):
 
     def pop(self):
         if self.order == min:
-            return self._items.pop(0)
+            del self._keys[0]
+            item = self._items.pop(0)
         else:
-            return self._items.pop()
+            del self._keys[-1]
+            item = self._items.pop()
+        self._index_discard(item)
+        return item
 
 
     def insert_right(self, item):
@@ -162,12 +181,13 @@ class SortedCollection(object):
         i = bisect_right(self._keys, k)
         self._keys.insert(i, k)
         self._items.insert(i, item)
+        self._index_add(item)
 
     def remove(self, item):
         'Remove first occurence of item.  Raise ValueError if not found'
         i = self.index(item)
         del self._keys[i]
-        del self._items[i]
+        self._index_discard(self._items.pop(i))
 
     def find(self, k):
         'Return first item with a key == k.  Raise ValueError if not found.'
@@ -3,7 +3,7 @@
 """
 
 from __future__ import generators
-import operator, math, random, copy, sys, os.path, bisect
+import operator, math, random, copy, sys, os.path, bisect, heapq, collections
 
 #______________________________________________________________________________
 # Compatibility with Python 2.2 and 2.3
@@ -533,13 +533,13 @@ def turn_left(orientation):
 
 def distance(a, b):
     "The distance between two (x, y) points."
-    ax, ay = x
+    ax, ay = a
     bx, by = b
     return math.hypot((ax - bx), (ay - by))
 
 def distance2(a, b):
     "The square of the distance between two (x, y) points."
-    ax, ay = x
+    ax, ay = a
     bx, by = b
     return (ax - bx)**2 + (ay - by)**2
 
@@ -651,73 +651,298 @@ def DataFile(name, mode='r'):
 
 
 #______________________________________________________________________________
-# Queues: Stack, FIFOQueue, PriorityQueue
-
-class Queue(object):
-    """Queue is an abstract class/interface. There are three types:
+# Queues: Stack, FIFOQueue, PriorityQueue, HeapPriorityQueue,
+# BucketPriorityQueue
+
+class KeyIndex(object):
+    """Mixin for collections that can keep an index, in _index, from
+    index_key(item) to the list of their items with that key, so that
+    membership tests and get are O(1).  Without an index_key, they fall
+    back to a linear scan comparing items with ==.  The collection calls
+    _index_add and _index_discard as items come and go."""
+
+    index_key = None
+
+    def __contains__(self, item):
+        if self.index_key is None:
+            return any(item == x for x in self)
+        return self.index_key(item) in self._index
+
+    def get(self, item, default=None):
+        "Return the item with the same key as item, or default."
+        if self.index_key is None:
+            return next((x for x in self if x == item), default)
+        queued = self._index.get(self.index_key(item))
+        return queued[0] if queued else default
+
+    def _index_add(self, item):
+        if self.index_key is not None:
+            self._index.setdefault(self.index_key(item), []).append(item)
+
+    def _index_discard(self, item):
+        if self.index_key is not None:
+            key = self.index_key(item)
+            queued = self._index[key]
+            for i, x in enumerate(queued):
+                if x is item:
+                    del queued[i]
+                    break
+            if not queued:
+                del self._index[key]
+
+class Queue(KeyIndex):
+    """Queue is an abstract class/interface. There are five types:
         Stack(): A Last In First Out Queue.
         FIFOQueue(): A First In First Out Queue.
         PriorityQueue(lt): Queue where items are sorted by lt, (default <).
+        HeapPriorityQueue(order, f): PriorityQueue kept as a binary heap.
+        BucketPriorityQueue(order, f, resolution): PriorityQueue kept as an
+            array of buckets, for priorities with few distinct values.
     Each type supports the following methods and functions:
         q.append(item)  -- add an item to the queue
         q.extend(items) -- equivalent to: for item in items: q.append(item)
         q.pop()         -- return the top item from the queue
         len(q)          -- number of items in q (also q.__len())
-    Note that isinstance(Stack(), Queue) is false, because we implement stacks
-    as lists.  If Python ever gets interfaces, Queue will be an interface."""
+        item in q       -- is an item with the same key queued?
+        q.get(item)     -- the queued item with the same key, or None
+    Given an index_key function, a queue keeps an index from
+    index_key(item) to the queued items (see KeyIndex); graph search uses
+    the key of each node's state."""
 
-    def __init__(self): 
+    def __init__(self):
         abstract
 
     def extend(self, items):
         for item in items: self.append(item)
 
-def Stack():
-    """Return an empty list, suitable as a Last-In-First-Out Queue."""
-    return []
+class Stack(Queue):
+    """A Last-In-First-Out Queue."""
+    def __init__(self, index_key=None):
+        update(self, A=[], _index={}, index_key=index_key)
+    def append(self, item):
+        self.A.append(item)
+        self._index_add(item)
+    def __len__(self):
+        return len(self.A)
+    def pop(self):
+        e = self.A.pop()
+        self._index_discard(e)
+        return e
+    def __iter__(self):
+        return self.A.__iter__()
 
 class FIFOQueue(Queue):
     """A First-In-First-Out Queue."""
-    def __init__(self):
+    def __init__(self, index_key=None):
         self.A = []; self.start = 0
+        self._index = {}; self.index_key = index_key
     def append(self, item):
         self.A.append(item)
+        self._index_add(item)
     def __len__(self):
         return len(self.A) - self.start
-    def extend(self, items):
-        self.A.extend(items)     
-    def pop(self):        
+    def pop(self):
         e = self.A[self.start]
         self.start += 1
         if self.start > 5 and self.start > len(self.A)/2:
             self.A = self.A[self.start:]
             self.start = 0
+        self._index_discard(e)
         return e
     def __iter__(self):
         '''needs to return an object which implements __next__() correctly
         The self.A list does this, so update it and return that'''
         self.A = self.A[self.start:]
+        self.start = 0
         return self.A.__iter__()
 
 class PriorityQueue(Queue):
     """A queue in which the minimum (or maximum) element (as determined by f and
     order) is returned first. If order is min, the item with minimum f(x) is
     returned first; if order is max, then it is the item with maximum f(x)."""
-    def __init__(self, order=min, f=lambda x: x):
-        update(self, A=[], order=order, f=f)
+    def __init__(self, order=min, f=lambda x: x, index_key=None):
+        update(self, A=[], order=order, f=f, _index={}, index_key=index_key)
     def append(self, item):
         bisect.insort(self.A, (self.f(item), item))
+        self._index_add(item)
     def __len__(self):
         return len(self.A)
     def pop(self):
         if self.order == min:
-            return self.A.pop(0)[1]
+            e = self.A.pop(0)[1]
         else:
-            return self.A.pop()[1]
+            e = self.A.pop()[1]
+        self._index_discard(e)
+        return e
     def __iter__(self):
-        '''needs to return an object which implements __next__() correctly
-        The self.A list does this, so update it and return that'''
-        return self.A.__iter__()
+        return iter([item for (_, item) in self.A])
+
+class KeyedPriorityQueue(Queue):
+    """Base of the priority queues that hold at most one item per
+    index_key(item).  index maps each key to the item's entry, a list with
+    the item at entry[item_slot]; removing an item only overwrites that
+    with REMOVED, and pop skips such dead entries (lazy deletion)."""
+    REMOVED = object() # placeholder for the item of a dead entry
+    item_slot = 0
+
+    def _discard(self, key):
+        "Mark the entry of the item queued under key, if any, dead."
+        if key in self.index:
+            self.index.pop(key)[self.item_slot] = self.REMOVED
+
+    def get(self, item, default=None):
+        "Return the queued item with the same key as item, or default."
+        entry = self.index.get(self.index_key(item))
+        return default if entry is None else entry[self.item_slot]
+
+    def remove(self, item):
+        "Remove the queued item with the same key as item."
+        key = self.index_key(item)
+        if key not in self.index:
+            raise ValueError('item not in priority queue')
+        self._discard(key)
+
+    def __contains__(self, item):
+        return self.index_key(item) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter([entry[self.item_slot] for entry in self.index.values()])
+
+class HeapPriorityQueue(KeyedPriorityQueue):
+    """A priority queue kept as a binary heap.  As with PriorityQueue, the
+    item with minimum (or maximum) f(x) is returned first; items with equal
+    f(x) come out last-in-first-out.  An index from index_key(item) to the
+    item's heap entry makes membership tests, get and remove O(1), while
+    append and pop are O(log n).  Only one item per key is queued: appending
+    an item whose key is already present replaces the queued one (this is
+    how to decrease its key).  Removed entries are marked dead and skipped
+    when they reach the top of the heap (see KeyedPriorityQueue).
+    >>> q = HeapPriorityQueue(f=lambda x: x[1], index_key=lambda x: x[0])
+    >>> q.extend([('a', 3), ('b', 1), ('c', 2), ('d', 1)])
+    >>> q.pop(), q.pop()
+    (('d', 1), ('b', 1))
+    >>> q.append(('a', 0))
+    >>> len(q), q.get(('a', None))
+    (2, ('a', 0))
+    >>> q.remove(('c', None)); ('c', None) in q
+    False
+    >>> q.pop(), len(q)
+    (('a', 0), 0)
+    >>> q.pop()
+    Traceback (most recent call last):
+    ...
+    IndexError: pop from an empty priority queue
+    >>> q = HeapPriorityQueue(max, f=lambda x: x[1], index_key=lambda x: x[0])
+    >>> q.extend([('a', 3), ('b', 1), ('c', 2)])
+    >>> [q.pop()[0] for _ in range(3)]
+    ['a', 'c', 'b']
+    """
+    item_slot = 2
+
+    def __init__(self, order=min, f=lambda x: x, index_key=lambda x: x):
+        update(self, heap=[], index={}, order=order, f=f, index_key=index_key,
+               count=0)
+
+    def append(self, item):
+        key = self.index_key(item)
+        self._discard(key)
+        priority = self.f(item)
+        if self.order != min:
+            priority = -priority
+        self.count += 1
+        # -count breaks ties LIFO and keeps heapq from ever comparing items
+        entry = [priority, -self.count, item, key]
+        self.index[key] = entry
+        heapq.heappush(self.heap, entry)
+
+    def pop(self):
+        while self.heap:
+            priority, count, item, key = heapq.heappop(self.heap)
+            if item is not self.REMOVED:
+                del self.index[key]
+                return item
+        raise IndexError('pop from an empty priority queue')
+
+class BucketPriorityQueue(KeyedPriorityQueue):
+    """A priority queue for priorities that take few distinct values, kept
+    as an array of buckets indexed by the discretised priority
+    round(f(x) * resolution), with a pointer to the lowest bucket that may
+    be non-empty.  Append is O(1); pop is O(1) plus the distance the
+    pointer has to move up to the next non-empty bucket.  Choose
+    resolution so that f(x) * resolution is (close to) an integer for
+    every item; priorities closer together than 1/resolution share a
+    bucket.  Within a bucket items come out last-in-first-out if lifo is
+    true, else first-in-first-out.  As with HeapPriorityQueue, there is
+    at most one item per index_key(item), appending an item whose key is
+    queued replaces the old one, and removed items are skipped lazily.
+    >>> q = BucketPriorityQueue(f=lambda x: x[1], index_key=lambda x: x[0],
+    ...                         resolution=10)
+    >>> q.extend([('a', 0.3), ('b', 0.1), ('c', 0.2), ('d', 0.1)])
+    >>> q.pop(), q.pop()
+    (('d', 0.1), ('b', 0.1))
+    >>> q.append(('e', -0.5)); q.append(('a', 0.0))
+    >>> [q.pop() for _ in range(len(q))]
+    [('e', -0.5), ('a', 0.0), ('c', 0.2)]
+    >>> q = BucketPriorityQueue(f=lambda x: x[1], index_key=lambda x: x[0],
+    ...                         lifo=False)
+    >>> q.extend([('a', 1), ('b', 1), ('c', 0)])
+    >>> q.remove(('c', None)); len(q)
+    2
+    >>> [q.pop()[0] for _ in range(len(q))]
+    ['a', 'b']
+    >>> q = BucketPriorityQueue(max, f=lambda x: x[1], index_key=lambda x: x[0])
+    >>> q.extend([('a', 1), ('b', 3), ('c', 2)])
+    >>> [q.pop()[0] for _ in range(3)]
+    ['b', 'c', 'a']
+    """
+
+    def __init__(self, order=min, f=lambda x: x, index_key=lambda x: x,
+                 resolution=1, lifo=True):
+        update(self, buckets=[], base=0, min=0, index={}, order=order, f=f,
+               index_key=index_key, resolution=resolution, lifo=lifo)
+
+    def bucket(self, item):
+        "The index of the bucket item belongs in."
+        b = int(round(self.f(item) * self.resolution))
+        return b if self.order == min else -b
+
+    def append(self, item):
+        key = self.index_key(item)
+        self._discard(key)
+        b = self.bucket(item)
+        if not self.buckets:
+            self.base = self.min = b
+        elif b < self.base:
+            self.buckets[:0] = [None] * (self.base - b)
+            self.base = b
+        i = b - self.base
+        if i >= len(self.buckets):
+            self.buckets.extend([None] * (i + 1 - len(self.buckets)))
+        if self.buckets[i] is None:
+            self.buckets[i] = collections.deque()
+        entry = [item, key]
+        self.buckets[i].append(entry)
+        self.index[key] = entry
+        if b < self.min:
+            self.min = b
+
+    def pop(self):
+        if not self.index:
+            raise IndexError('pop from an empty priority queue')
+        buckets = self.buckets
+        i = self.min - self.base
+        while True:
+            bucket = buckets[i]
+            while bucket:
+                item, key = bucket.pop() if self.lifo else bucket.popleft()
+                if item is not self.REMOVED:
+                    self.min = self.base + i
+                    del self.index[key]
+                    return item
+            i += 1
 
 ## Fig: The idea is we can define things like Fig[3,10] later.
 ## Alas, it is Fig[3,10] not Fig[3.10], because that would be the same as Fig[3.1]